@@ -0,0 +1,220 @@
+import numpy as np
+
+from dataset import FEATURES
+from histogram import Binning, MAX_BINS, season_histograms
+
+# Group ids as used by the 'choose_group' checklist (is_top4)
+GROUPS = [1, 0]
+
+# Statistics offered for the time-series charts. Rolling windows cover the
+# last N seasons and are cut at the first season of the selected range.
+WINDOW_STATS = ['mean', 'rolling_mean', 'rolling_median', 'rolling_std', 'expanding_mean']
+
+
+def cell_cross_products(values, cells, n_cells):
+    # X^T X of the rows in each cell: one matrix product per cell over rows
+    # sorted by cell, so memory stays O(rows x features)
+    order = np.argsort(cells, kind='mergesort')
+    values = values[order]
+    bounds = np.searchsorted(cells[order], np.arange(n_cells + 1))
+    cross = np.zeros((n_cells, values.shape[1], values.shape[1]))
+    for cell in range(n_cells):
+        block = values[bounds[cell]:bounds[cell + 1]]
+        if len(block):
+            cross[cell] = block.T.dot(block)
+    return cross
+
+
+class SeasonCube(object):
+    # Per-(group, season, feature) counts, sums and value histograms.
+    # Everything is stored as prefix sums over the season axis, so any
+    # [lo, hi] season range is answered by subtracting two rows. The value
+    # histograms use the display bins; rolling medians use a second histogram
+    # with one bin per distinct value, so they are exact.
+    # bins maps a feature to a fixed histogram bin width. recorded maps a
+    # feature to the seasons where it is recorded; the zero placeholders of
+    # the other seasons are left out when its bins are fitted.
+    def __init__(self, data, features=FEATURES, bins=None, max_bins=MAX_BINS, recorded=None):
+        self.features = list(features)
+        self.seasons = np.sort(np.unique(np.asarray(data['season']).astype(int)))
+
+        row_seasons = np.asarray(data['season']).astype(int)
+        s_idx = np.searchsorted(self.seasons, row_seasons)
+        g_idx = np.asarray(data['is_top4']).astype(int)
+        n_seasons = len(self.seasons)
+
+        count = np.zeros((2, n_seasons), dtype=np.int64)
+        np.add.at(count, (g_idx, s_idx), 1)
+        self.count = count
+        self.cum_count = self._prefix(count)
+
+        self.sum = {}
+        self.cum_sum = {}
+        self.binning = {}
+        self.cum_hist = {}
+        self.feature_index = {feature: i for i, feature in enumerate(self.features)}
+        values = np.empty((len(s_idx), len(self.features)))
+        cells = g_idx * n_seasons + s_idx
+        # Values sorted by (group, season) cell for the clientside medians
+        self.cell_bounds = np.searchsorted(np.sort(cells), np.arange(2 * n_seasons + 1))
+        self.cell_values = {}
+        self.distinct = {}
+        self.cum_rank_hist = {}
+        for i, feature in enumerate(self.features):
+            v = np.asarray(data[feature]).astype(float)
+            values[:, i] = v
+            self.cell_values[feature] = v[np.lexsort((v, cells))]
+            self.distinct[feature], ranks = np.unique(v, return_inverse=True)
+            rank_hist = np.zeros((2, n_seasons, len(self.distinct[feature])), dtype=np.int64)
+            np.add.at(rank_hist, (g_idx, s_idx, ranks), 1)
+            self.cum_rank_hist[feature] = self._prefix(rank_hist)
+            sums = np.zeros((2, n_seasons))
+            np.add.at(sums, (g_idx, s_idx), v)
+            self.sum[feature] = sums
+            self.cum_sum[feature] = self._prefix(sums)
+
+            fitted = v
+            if recorded is not None and feature in recorded:
+                is_recorded = np.isin(row_seasons, list(recorded[feature]))
+                if is_recorded.any():
+                    fitted = v[is_recorded]
+            binning = Binning(fitted, (bins or {}).get(feature), max_bins)
+            self.binning[feature] = binning
+            self.cum_hist[feature] = self._prefix(season_histograms(g_idx, s_idx, v, binning, n_seasons))
+
+        # Sufficient statistics for correlations and effect sizes: feature
+        # sums and cross products per (group, season), as prefix sums
+        self.cum_sums = np.stack([self.cum_sum[feature] for feature in self.features], axis=-1)
+        cross = cell_cross_products(values, cells, 2 * n_seasons)
+        self.cum_cross = self._prefix(cross.reshape(2, n_seasons, len(self.features), len(self.features)))
+
+    @staticmethod
+    def _prefix(arr):
+        # Prepend a zero row along the season axis and accumulate
+        shape = list(arr.shape)
+        shape[1] += 1
+        out = np.zeros(shape, dtype=arr.dtype)
+        np.cumsum(arr, axis=1, out=out[:, 1:])
+        return out
+
+    def season_slice(self, lo, hi):
+        start = np.searchsorted(self.seasons, lo, side='left')
+        stop = np.searchsorted(self.seasons, hi, side='right')
+        return start, stop
+
+    def years(self, lo, hi):
+        start, stop = self.season_slice(lo, hi)
+        return self.seasons[start:stop]
+
+    def means(self, feature, group, lo, hi):
+        # Mean of the feature for each season in [lo, hi]
+        start, stop = self.season_slice(lo, hi)
+        sums = self.sum[feature][group, start:stop]
+        counts = self.count[group, start:stop]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    def window_bounds(self, lo, hi, window=None):
+        # Prefix rows [begin, end) of the window ending at each season in
+        # [lo, hi]; window=None means everything since lo
+        start, stop = self.season_slice(lo, hi)
+        ends = np.arange(start + 1, stop + 1)
+        if window is None:
+            return np.full(len(ends), start), ends
+        return np.maximum(ends - int(window), start), ends
+
+    def window_stats(self, feature, group, lo, hi, stat='mean', window=3):
+        # One value per season in [lo, hi]; every window is the difference
+        # of two prefix rows, so a whole series costs O(seasons)
+        if stat == 'mean':
+            return self.means(feature, group, lo, hi)
+        begins, ends = self.window_bounds(lo, hi, None if stat == 'expanding_mean' else window)
+        counts = self.cum_count[group, ends] - self.cum_count[group, begins]
+        sums = self.cum_sum[feature][group, ends] - self.cum_sum[feature][group, begins]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if stat in ('rolling_mean', 'expanding_mean'):
+                return np.where(counts > 0, sums / counts, np.nan)
+            if stat == 'rolling_std':
+                i = self.feature_index[feature]
+                squares = self.cum_cross[group, ends, i, i] - self.cum_cross[group, begins, i, i]
+                var = (squares - sums ** 2 / counts) / (counts - 1)
+                return np.where(counts > 1, np.sqrt(np.clip(var, 0, None)), np.nan)
+        if stat == 'rolling_median':
+            # Exact: the window's histogram over the feature's distinct
+            # values, averaging the values at the two middle ranks (the same
+            # one for odd counts)
+            cum = self.cum_rank_hist[feature][group]
+            cdf = np.cumsum(cum[ends] - cum[begins], axis=1)
+            distinct = self.distinct[feature]
+            lower = np.argmax(cdf >= ((counts + 1) // 2)[:, None], axis=1)
+            upper = np.argmax(cdf >= (counts // 2 + 1)[:, None], axis=1)
+            return np.where(counts > 0, (distinct[lower] + distinct[upper]) / 2, np.nan)
+        raise ValueError('unknown window statistic: %s' % stat)
+
+    def histogram(self, groups, feature, lo, hi):
+        # Stacked bin counts of the feature in [lo, hi], one row per group.
+        # Bins that are empty for every requested group are dropped.
+        start, stop = self.season_slice(lo, hi)
+        cum = self.cum_hist[feature][groups]
+        counts = cum[:, stop] - cum[:, start]
+        nonzero = counts.sum(axis=0) > 0
+        binning = self.binning[feature]
+        return binning.centers()[nonzero], counts[:, nonzero], binning.width
+
+    def moments(self, groups, features, lo, hi):
+        # Row count, feature sums and cross products over [lo, hi] for the
+        # given groups combined
+        start, stop = self.season_slice(lo, hi)
+        idx = [self.feature_index[feature] for feature in features]
+        n = (self.cum_count[groups, stop] - self.cum_count[groups, start]).sum()
+        sums = (self.cum_sums[groups, stop] - self.cum_sums[groups, start]).sum(axis=0)[idx]
+        cross = (self.cum_cross[groups, stop] - self.cum_cross[groups, start]).sum(axis=0)[np.ix_(idx, idx)]
+        return n, sums, cross
+
+    def correlation(self, groups, features, lo, hi):
+        # Pearson correlation matrix; NaN for constant features or < 2 rows
+        n, sums, cross = self.moments(groups, features, lo, hi)
+        if n < 2:
+            return np.full((len(features), len(features)), np.nan)
+        mean = sums / n
+        cov = cross / n - np.outer(mean, mean)
+        sd = np.sqrt(np.clip(np.diag(cov), 0, None))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = cov / np.outer(sd, sd)
+        return np.clip(corr, -1, 1)
+
+    def effect_sizes(self, features, lo, hi):
+        # Cohen's d of Top 4 against Below 4 for each feature, using the
+        # pooled standard deviation
+        stats = []
+        for group in GROUPS:
+            n, sums, cross = self.moments([group], features, lo, hi)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = sums / n
+                var = (np.diag(cross) - n * mean ** 2) / (n - 1)
+            stats.append((n, mean, var))
+        (n1, mean1, var1), (n0, mean0, var0) = stats
+        if n1 < 2 or n0 < 2:
+            return np.full(len(features), np.nan)
+        pooled = np.sqrt(np.clip(((n1 - 1) * var1 + (n0 - 1) * var0) / (n1 + n0 - 2), 0, None))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(pooled > 0, (mean1 - mean0) / pooled, np.nan)
+
+    def client_payload(self):
+        # Everything the clientside chart callbacks need, as plain JSON
+        return {
+            'seasons': self.seasons.tolist(),
+            'count': self.count.tolist(),
+            'cell_bounds': self.cell_bounds.tolist(),
+            'features': {
+                feature: {
+                    'sum': np.round(self.sum[feature], 6).tolist(),
+                    'sumsq': np.round(np.diff(self.cum_cross[:, :, i, i], axis=1), 6).tolist(),
+                    'bins': self.binning[feature].centers().tolist(),
+                    'width': self.binning[feature].width,
+                    'cum_hist': self.cum_hist[feature].tolist(),
+                    'values': np.round(self.cell_values[feature], 6).tolist()
+                }
+                for i, feature in enumerate(self.features)
+            }
+        }
@@ -0,0 +1,300 @@
+import functools
+import hashlib
+import json
+from collections import OrderedDict
+
+import flask
+import numpy as np
+
+from aggregates import GROUPS
+from dataset import COLUMNS
+from figures import compact
+from table_query import query_rows
+
+# Read-only data API on app.server, answered from the same datasets, season
+# indexes and aggregate cubes as the callbacks. Every query takes an optional
+# league=<id> (default: the dashboard's default league).
+#   GET  /api/v1/meta
+#   GET  /api/v1/aggregates?feature=goal&feature=won[&group=1][&lo=2011&hi=2020]
+#   GET  /api/v1/histograms?feature=goal[&group=1][&lo=..&hi=..]
+#   GET  /api/v1/rows?[lo, hi, group, filter, sort=points:desc,goal, column, offset, limit]
+#   GET  /api/v1/clubs?club=Arsenal&club=Chelsea&feature=points[&lo=..&hi=..]
+#   POST /api/v1/batch  {"league": "epl", "queries": [{"kind": "aggregates", "feature": ["goal", "won"]}, ...]}
+# List parameters can be repeated or comma separated. Results are columnar:
+# {"version": ..., "columns": {name: [values]}, ...}. format=arrow (or
+# Accept: application/vnd.apache.arrow.stream) returns Arrow IPC instead when
+# pyarrow is installed.
+#
+# Every response carries a strong ETag of the dataset version and the query,
+# so a client repeating a request after no ingest gets a 304 without the
+# query being evaluated. compress.py makes it encoding specific.
+API_PREFIX = '/api/v1'
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+MAX_ROWS = 1000
+
+
+class ApiError(ValueError):
+    pass
+
+
+@functools.lru_cache(maxsize=None)
+def arrow_module():
+    # pyarrow is optional and slow to import, so workers load it on the first
+    # Arrow request; None when it is not installed
+    try:
+        import pyarrow
+        import pyarrow.ipc
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def param_list(params, name):
+    # Batch queries are JSON, so list items can be anything: only strings and
+    # numbers are accepted
+    values = params.getlist(name) if hasattr(params, 'getlist') else params.get(name, [])
+    if not isinstance(values, list):
+        values = [values]
+    if not all(isinstance(value, (str, int, float)) for value in values):
+        raise ApiError('%s must be strings or numbers' % name)
+    return [part.strip() if isinstance(part, str) else part
+            for value in values
+            for part in (value.split(',') if isinstance(value, str) else [value])
+            if part != '']
+
+
+def param_int(params, name, default):
+    value = params.get(name, default)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ApiError('%s must be an integer' % name)
+
+
+def features_param(cube, params):
+    features = param_list(params, 'feature')
+    if not features:
+        raise ApiError('feature is required')
+    unknown = [feature for feature in features if feature not in cube.features]
+    if unknown:
+        raise ApiError('unknown feature: %s' % ', '.join(map(str, unknown)))
+    return features
+
+
+def groups_param(params):
+    try:
+        groups = [int(group) for group in param_list(params, 'group')]
+    except (TypeError, ValueError):
+        groups = [None]
+    if any(group not in GROUPS for group in groups):
+        raise ApiError('group must be one of %s' % GROUPS)
+    return [group for group in GROUPS if group in groups] if groups else list(GROUPS)
+
+
+def season_range(cube, params):
+    return (param_int(params, 'lo', int(cube.seasons[0])),
+            param_int(params, 'hi', int(cube.seasons[-1])))
+
+
+def aggregates_table(data, cube, params):
+    # Per-season feature means, one row per (season, group)
+    features = features_param(cube, params)
+    groups = groups_param(params)
+    lo, hi = season_range(cube, params)
+    start, stop = cube.season_slice(lo, hi)
+    years = cube.seasons[start:stop]
+    columns = OrderedDict()
+    columns['season'] = np.tile(years, len(groups))
+    columns['group'] = np.repeat(groups, len(years))
+    columns['count'] = np.concatenate([cube.count[group, start:stop] for group in groups])
+    for feature in features:
+        columns[feature] = np.concatenate([cube.means(feature, group, lo, hi) for group in groups])
+    return columns, {}
+
+
+def histograms_table(data, cube, params):
+    # Bin counts per group, one row per (feature, bin)
+    features = features_param(cube, params)
+    groups = groups_param(params)
+    lo, hi = season_range(cube, params)
+    parts = [(feature,) + cube.histogram(groups, feature, lo, hi) for feature in features]
+    columns = OrderedDict()
+    columns['feature'] = [feature for feature, centers, _, _ in parts for _ in centers]
+    columns['bin'] = np.concatenate([centers for _, centers, _, _ in parts])
+    columns['width'] = np.concatenate([np.full(len(centers), width) for _, centers, _, width in parts])
+    for i, group in enumerate(groups):
+        columns['count_%d' % group] = np.concatenate([counts[i] for _, _, counts, _ in parts])
+    return columns, {}
+
+
+def rows_table(data, cube, params):
+    # Dataset rows in a season range, with the DataTable filter syntax
+    lo, hi = season_range(cube, params)
+    groups = groups_param(params)
+    group = groups[0] if len(groups) == 1 else None
+    sort_by = []
+    for part in param_list(params, 'sort'):
+        if not isinstance(part, str):
+            raise ApiError('bad sort: %s' % part)
+        column_id, _, direction = part.partition(':')
+        if column_id not in COLUMNS or direction not in ('', 'asc', 'desc'):
+            raise ApiError('bad sort: %s' % part)
+        sort_by.append({'column_id': column_id, 'direction': direction or 'asc'})
+    names = param_list(params, 'column') or COLUMNS
+    unknown = [name for name in names if name not in COLUMNS]
+    if unknown:
+        raise ApiError('unknown column: %s' % ', '.join(map(str, unknown)))
+    offset = max(param_int(params, 'offset', 0), 0)
+    limit = min(max(param_int(params, 'limit', MAX_ROWS), 0), MAX_ROWS)
+    filter_query = params.get('filter', '')
+    if not isinstance(filter_query, str):
+        raise ApiError('filter must be a string')
+
+    rows = query_rows(data, data.season_index.rows_between(lo, hi, group), filter_query, sort_by)
+    page = rows[offset:offset + limit]
+    columns = OrderedDict((name, data[name][page]) for name in names)
+    return columns, {'total': int(len(rows)), 'offset': offset}
+
+
+def clubs_table(data, cube, params):
+    # Per-club series from the club index, one row per (club, season)
+    clubs = param_list(params, 'club')
+    if not clubs:
+        raise ApiError('club is required')
+    unknown = [club for club in clubs if club not in data.club_codes]
+    if unknown:
+        raise ApiError('unknown club: %s' % ', '.join(map(str, unknown)))
+    features = features_param(cube, params)
+    lo, hi = season_range(cube, params)
+    series = [(club, [data.club_series(club, feature, lo, hi) for feature in features]) for club in clubs]
+    columns = OrderedDict()
+    columns['club_name'] = [club for club, values in series for _ in values[0][0]]
+    columns['season'] = np.concatenate([values[0][0] for _, values in series])
+    for i, feature in enumerate(features):
+        columns[feature] = np.concatenate([values[i][1] for _, values in series])
+    return columns, {}
+
+
+QUERIES = OrderedDict([
+    ('aggregates', aggregates_table),
+    ('histograms', histograms_table),
+    ('rows', rows_table),
+    ('clubs', clubs_table)
+])
+
+
+def result_meta(columns, meta):
+    return OrderedDict([('rows', len(next(iter(columns.values()))))] + list(meta.items()))
+
+
+def json_columns(columns):
+    return OrderedDict(
+        (name, compact(values) if np.asarray(values).dtype.kind in 'iufb' else [str(v) for v in values])
+        for name, values in columns.items())
+
+
+def arrow_body(columns, meta):
+    pyarrow = arrow_module()
+    table = pyarrow.table(OrderedDict(
+        (name, np.asarray(values) if np.asarray(values).dtype.kind in 'iufb' else [str(v) for v in values])
+        for name, values in columns.items()))
+    table = table.replace_schema_metadata({key: str(value) for key, value in meta.items()})
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def json_response(value):
+    # Keeps the column order, which flask.jsonify would sort
+    return flask.Response(json.dumps(value), mimetype='application/json')
+
+
+def wants_arrow(params):
+    if params.get('format') == 'arrow':
+        return True
+    return flask.request.accept_mimetypes.best_match(['application/json', ARROW_MIMETYPE]) == ARROW_MIMETYPE
+
+
+def init_app(server, source, default_league):
+    # source(league) returns the league's current store.League, loading it on
+    # first use; it raises KeyError for a league that is not in the catalog
+    def conditional(league, key, build):
+        try:
+            state = source(league)
+        except KeyError:
+            return json_response({'error': 'unknown league: %s' % league}), 404
+        data, cube = state.data, state.cube
+        etag = hashlib.sha1(json.dumps([data.version, key], sort_keys=True).encode()).hexdigest()
+        if etag in flask.request.if_none_match:
+            response = flask.Response(status=304)
+        else:
+            try:
+                response = build(data, cube)
+            except ApiError as e:
+                return json_response({'error': str(e)}), 400
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        response.vary.add('Accept')
+        return response
+
+    def query_view(kind):
+        def view():
+            params = flask.request.args
+            arrow = wants_arrow(params)
+            if arrow and arrow_module() is None:
+                return json_response({'error': 'Arrow output needs pyarrow'}), 406
+
+            def build(data, cube):
+                columns, meta = QUERIES[kind](data, cube, params)
+                meta = result_meta(columns, meta)
+                meta['version'] = data.version
+                meta.move_to_end('version', last=False)
+                if arrow:
+                    return flask.Response(arrow_body(columns, meta), mimetype=ARROW_MIMETYPE)
+                meta['columns'] = json_columns(columns)
+                return json_response(meta)
+            return conditional(params.get('league', default_league), [kind, arrow, sorted(params.lists())], build)
+        view.__name__ = 'api_' + kind
+        return view
+
+    for kind in QUERIES:
+        server.add_url_rule('%s/%s' % (API_PREFIX, kind), view_func=query_view(kind))
+
+    @server.route(API_PREFIX + '/meta')
+    def api_meta():
+        league = flask.request.args.get('league', default_league)
+
+        def build(data, cube):
+            return json_response({
+                'league': league, 'version': data.version, 'rows': len(data), 'seasons': cube.seasons.tolist(),
+                'features': cube.features, 'groups': GROUPS, 'clubs': data.clubs.tolist(),
+                'columns': COLUMNS
+            })
+        return conditional(league, ['meta'], build)
+
+    @server.route(API_PREFIX + '/batch', methods=['POST'])
+    def api_batch():
+        # Several queries in one round trip; JSON only
+        body = flask.request.get_json(silent=True) or {}
+        queries = body.get('queries')
+        league = body.get('league', default_league)
+        if not isinstance(queries, list):
+            return json_response({'error': 'body must be {"queries": [...]}'}), 400
+        if not isinstance(league, str):
+            return json_response({'error': 'league must be a string'}), 400
+
+        def build(data, cube):
+            results = []
+            for i, query in enumerate(queries):
+                if not isinstance(query, dict) or query.get('kind') not in QUERIES:
+                    raise ApiError('query %d: kind must be one of %s' % (i, list(QUERIES)))
+                try:
+                    columns, meta = QUERIES[query['kind']](data, cube, query)
+                except ApiError as e:
+                    raise ApiError('query %d: %s' % (i, e))
+                meta = result_meta(columns, meta)
+                meta['columns'] = json_columns(columns)
+                results.append(meta)
+            return json_response({'version': data.version, 'results': results})
+        return conditional(league, ['batch', queries], build)
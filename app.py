@@ -1,19 +1,70 @@
-import plotly.graph_objects as go
+from startup import StartupProfile
+
+# Boot time per phase; see startup.py
+startup = StartupProfile()
+
 import dash
+import flask
 import dash_table
 import dash_html_components as html
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
-import pandas as pd
+import json
 import numpy as np
-from dash.dependencies import Input, Output
+import os
+import sys
+import threading
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from dash.exceptions import PreventUpdate
+from plotly.utils import PlotlyJSONEncoder
+startup.mark('dash imports')
+
+import api
+import compress
+from aggregates import GROUPS, WINDOW_STATS
+from cache import FigureCache
+from cancellation import SupersededRequests
+from dataset import TABLE_FEATURES, CLUB_FEATURES, FEATURES
+from figures import BASE_LAYOUT, bar_figure, heatmap_figure, line_figure, ranking_figure, series_figure
+from metrics import CallbackMetrics
+from model import MODEL_PATH, Top4Forecast, load_model
+from snapshot import FAST_START, load_snapshot, save_snapshot, source_digest
+from store import CatalogWatcher, DEFAULT_LEAGUE, LEAGUE_CACHE_SIZE, League, LRUCache, PartitionStore
+from table_query import PAGE_SIZE, page_records, query_rows, table_columns
+startup.mark('app modules')
+
+# Partitioned dataset store (data_preprocssing.py). Only the catalog is read
+# at startup; a league's partitions are loaded when a session first selects it.
+store = PartitionStore()
+
+# Loaded leagues with their per-season aggregates, built once per league
+# version so the callbacks never rescan rows. Bounded: the least recently
+# used league is dropped when another one is opened.
+leagues = LRUCache(lambda key: League(store, key[0]), LEAGUE_CACHE_SIZE)
+
+def league_state(league):
+    # Raises KeyError for a league that is not in the catalog
+    return leagues.get((league, store.league(league)['version']))
+
+# Rendered figures, keyed on callback inputs (league included) and the
+# catalog version
+figure_cache = FigureCache(namespace=store.version)
+
+# Top 4 forecasts from the offline-trained model (python model.py train);
+# None when no model has been trained
+top4_model = load_model()
+top4_forecast = Top4Forecast(top4_model) if top4_model else None
+startup.mark('catalog and model')
 
-# Data Preprocessing
-clubstats = pd.read_csv('p_clubstats.csv')
-tables = pd.read_csv('p_tables.csv')
-top4 = pd.read_csv('top4.csv')
-below4 = pd.read_csv('below4.csv')
-df = pd.read_csv('df.csv')
+# Ship the per-season aggregates to the browser once per page load and draw
+# the charts with clientside callbacks, so slider and group changes need no
+# server work
+CLIENTSIDE_CHARTS = os.environ.get('CLIENTSIDE_CHARTS') == '1'
+
+# 'mouseup' (the RangeSlider default) updates the dashboard once the slider
+# handle is released; 'drag' follows the handle and relies on superseded
+# requests being dropped
+SLIDER_UPDATEMODE = os.environ.get('SLIDER_UPDATEMODE', 'mouseup')
 
 
 # Dashboard
@@ -22,554 +73,761 @@ app = dash.Dash(
 )
 server = app.server
 
-row = html.Div(
-    [
-        # Title
-        dbc.Row(
-            [
-                html.H1('EPL Dashboard', style={'margin-bottom': '1%'}),
-                html.H6(dbc.Badge('Beta'))
-            ]),
-        # Team & Season Slider 
-        dbc.Row(
-            [
-                dbc.Col(html.Div(
-                    [
-                        html.Div(
-                            [
-                                html.A('Select the group that you want to see.', style={'margin-top': '1%', 'fontWeight': '500'}),
-                                dcc.Checklist(id='choose_group', options=[
-                                                                            {'label': 'Top 4', 'value': 1},
-                                                                            {'label': 'Below 4', 'value': 0}
-                                                                            ], 
-                                                                value=[1, 0],
-                                                                inputStyle={'margin-left': '10px', 'margin-right': '1px'}),
-                                html.A('Select Table features', style={'fontWeight': '500'}),
-                                dcc.Dropdown(id='table_dropdown', options=[
-                                                                            {'label': i, 'value': i}
-                                                                            for i in tables.columns.drop(['position', 'club_name', 'season'])
-                                                                            ], 
-                                                                value='goal',
-                                                                clearable=False, style={'margin-bottom': '3%'}),
-                                html.A('Select Club Statistics features', style={'margin-top': '3%', 'fontWeight': '500'}),
-                                dcc.Dropdown(id='club_dropdown', options=[
-                                                                            {'label': i, 'value': i}
-                                                                            for i in clubstats.columns.drop('club_name')
-                                                                            ], 
-                                                                value='big_chance_created',
-                                                                clearable=False, style={'margin-bottom': '3%'}),
-                                html.A('Select the range of season', style= {'fontWeight': '500'}),
-                                dcc.RangeSlider(id='season_slider',
-                                                min=1993,
-                                                max=2020,
-                                                value=[1993, 2020],
-                                                tooltip={'always_visible': False, 'placement': 'bottomRight'}
-                                                )
-                                ], style={'margin-top': '0.5%'}
-                            )], style= {
+
+# Set once the common figures are in the cache; until then /ready returns 503
+# so the load balancer keeps traffic on warm workers
+ready = threading.Event()
+
+
+@server.route('/health')
+def health():
+    return flask.jsonify({'status': 'ok', 'pid': os.getpid()})
+
+
+@server.route('/ready')
+def readiness():
+    status = 200 if ready.is_set() else 503
+    return flask.jsonify({'ready': ready.is_set(), 'version': store.version, 'pid': os.getpid()}), status
+
+
+@server.route('/cache/stats')
+def cache_stats():
+    return flask.jsonify(figure_cache.stats())
+
+
+# Per-callback timings and payload sizes on /metrics
+callback_metrics = CallbackMetrics()
+callback_metrics.init_app(server)
+callback_metrics.add_collector(
+    lambda: {'figure_cache_%s' % key: value for key, value in figure_cache.stats().items()})
+callback_metrics.add_collector(lambda: {
+    'leagues_loaded': len(leagues), 'partitions_loaded': len(store.partitions),
+    'partition_cache_hits': store.partitions.hits, 'partition_cache_misses': store.partitions.misses})
+
+# gzip/brotli responses; registered after the metrics hook so /metrics
+# reports the compressed size
+compress.init_app(server)
+
+# Read-only JSON/Arrow API over the leagues' datasets and aggregates
+api.init_app(server, league_state, DEFAULT_LEAGUE)
+
+# Stale slider/group requests from the same session are dropped
+superseded_requests = SupersededRequests()
+superseded_requests.init_app(server)
+callback_metrics.add_collector(lambda: {'superseded_requests_dropped': superseded_requests.dropped})
+callback_metrics.add_collector(startup.metrics)
+
+
+# Hot reload after an ingest: leagues are reloaded lazily from the new catalog
+catalog_watcher = CatalogWatcher()
+
+def reload_data():
+    store.reload_catalog()
+    leagues.clear()
+    figure_cache.set_namespace(store.version)
+
+@server.before_request
+def check_catalog():
+    if catalog_watcher.changed():
+        reload_data()
+startup.mark('server setup')
+
+# Initial dashboard state; the page is served with these panels already
+# rendered, so the first load needs no callback requests
+DEFAULT_GROUP = [1, 0]
+DEFAULT_TABLE_FEATURE = 'goal'
+DEFAULT_CLUB_FEATURE = 'big_chance_created'
+DEFAULT_TAB = 'tab_1'
+DEFAULT_COMPARE_FEATURE = 'points'
+DEFAULT_WINDOW_STAT = 'mean'
+DEFAULT_WINDOW_SIZE = 3
+
+WINDOW_STAT_LABELS = {
+    'mean': 'Per-season mean', 'rolling_mean': 'Rolling mean', 'rolling_median': 'Rolling median',
+    'rolling_std': 'Rolling std', 'expanding_mean': 'Expanding mean'
+}
+
+# Layout snapshot for the current catalog version: the component tree and
+# its serialized JSON
+layout_snapshot = {}
+
+def current_layout():
+    # Rebuilt when the catalog version changes so the slider picks up newly
+    # ingested seasons
+    version = store.version
+    layout = layout_snapshot.get(version)
+    if layout is None:
+        tree = build_layout()
+        layout = (tree, json.dumps(tree, cls=PlotlyJSONEncoder))
+        layout_snapshot.clear()
+        layout_snapshot[version] = layout
+    return layout
+
+def serve_layout():
+    return current_layout()[0]
+
+@server.before_request
+def serve_serialized_layout():
+    # Every page load of a catalog version gets the same layout, so it is
+    # sent pre-serialized instead of Dash encoding the tree per request
+    if flask.request.path == app.config.routes_pathname_prefix + '_dash-layout':
+        return flask.Response(current_layout()[1], mimetype='application/json')
+
+def snapshot_key():
+    # Everything the snapshot contents depend on; see snapshot.py
+    return [store.version, source_digest([MODEL_PATH]), dash.__version__, DEFAULT_LEAGUE,
+            CLIENTSIDE_CHARTS, SLIDER_UPDATEMODE]
+
+def save_startup_snapshot():
+    save_snapshot(snapshot_key(), {
+        'league': league_state(DEFAULT_LEAGUE),
+        'layout': current_layout(),
+        'figures': figure_cache.items()
+    })
+
+# Fast start: restore the default league, the layout and the warmed figures
+# instead of building them
+startup_snapshot = load_snapshot(snapshot_key()) if FAST_START else None
+if startup_snapshot is not None:
+    leagues.put((DEFAULT_LEAGUE, store.league(DEFAULT_LEAGUE)['version']), startup_snapshot['league'])
+    layout_snapshot[store.version] = startup_snapshot['layout']
+    figure_cache.update(startup_snapshot['figures'])
+startup.mark('snapshot')
+
+def default_clubs(league):
+    # Compare the top two clubs of the latest season by default
+    return [str(club) for club in league_state(league).data['club_name'][:2]]
+
+def build_layout(league=DEFAULT_LEAGUE):
+    state = league_state(league)
+    season_range = state.season_range()
+    table_data, table_cols, _, table_pages, table_total = show_table(league, DEFAULT_TAB, season_range, DEFAULT_GROUP)
+    compare_clubs = default_clubs(league)
+    return html.Div(
+        [
+            # Title
+            dbc.Row(
+                [
+                    html.H1('EPL Dashboard', style={'margin-bottom': '1%'}),
+                    html.H6(dbc.Badge('Beta'))
+                ]),
+            # Team & Season Slider 
+            dbc.Row(
+                [
+                    dbc.Col(html.Div(
+                        [
+                            html.Div(
+                                [
+                                    html.A('Select the league', style={'fontWeight': '500'}),
+                                    dcc.Dropdown(id='league_dropdown', options=[
+                                                                                {'label': entry['name'], 'value': key}
+                                                                                for key, entry in sorted(store.leagues().items())
+                                                                                ],
+                                                                    value=league,
+                                                                    clearable=False, style={'margin-bottom': '3%'}),
+                                    html.A('Select the group that you want to see.', style={'margin-top': '1%', 'fontWeight': '500'}),
+                                    dcc.Checklist(id='choose_group', options=[
+                                                                                {'label': 'Top 4', 'value': 1},
+                                                                                {'label': 'Below 4', 'value': 0}
+                                                                                ], 
+                                                                    value=DEFAULT_GROUP,
+                                                                    inputStyle={'margin-left': '10px', 'margin-right': '1px'}),
+                                    html.A('Select Table features', style={'fontWeight': '500'}),
+                                    dcc.Dropdown(id='table_dropdown', options=[
+                                                                                {'label': i, 'value': i}
+                                                                                for i in TABLE_FEATURES
+                                                                                ], 
+                                                                    value=DEFAULT_TABLE_FEATURE,
+                                                                    clearable=False, style={'margin-bottom': '3%'}),
+                                    html.A('Select Club Statistics features', style={'margin-top': '3%', 'fontWeight': '500'}),
+                                    dcc.Dropdown(id='club_dropdown', options=[
+                                                                                {'label': i, 'value': i}
+                                                                                for i in CLUB_FEATURES
+                                                                                ], 
+                                                                    value=DEFAULT_CLUB_FEATURE,
+                                                                    clearable=False, style={'margin-bottom': '3%'}),
+                                    html.A('Select the time-series statistic', style={'fontWeight': '500'}),
+                                    dbc.Row(
+                                        [
+                                            dbc.Col(dcc.Dropdown(id='window_stat', options=[
+                                                                                {'label': WINDOW_STAT_LABELS[i], 'value': i}
+                                                                                for i in WINDOW_STATS
+                                                                                ],
+                                                                    value=DEFAULT_WINDOW_STAT,
+                                                                    clearable=False), width=8),
+                                            dbc.Col(dcc.Dropdown(id='window_size', options=[
+                                                                                {'label': '%d seasons' % i, 'value': i}
+                                                                                for i in range(2, 11)
+                                                                                ],
+                                                                    value=DEFAULT_WINDOW_SIZE,
+                                                                    clearable=False), width=4)
+                                        ], style={'margin-bottom': '3%'}),
+                                    html.A('Select the range of season', style= {'fontWeight': '500'}),
+                                    dcc.RangeSlider(id='season_slider',
+                                                    min=season_range[0],
+                                                    max=season_range[1],
+                                                    value=season_range,
+                                                    updatemode=SLIDER_UPDATEMODE,
+                                                    tooltip={'always_visible': False, 'placement': 'bottomRight'}
+                                                    )
+                                    ], style={'margin-top': '0.5%'}
+                                )], style= {
+                                            'border-radius': '10px',
+                                            'box-shadow': '5px 5px #e6ebed',
+                                            'background': '#f7f9fa',
+                                            'padding': '3%',
+                                            'margin-left': '0%',
+                                            'margin-bottom': '7%'
+                                            }
+                                        )
+                                    ),
+                    # Tabs for tables
+                    dbc.Col(
+                        [
+                            dcc.Tabs(id='table_tabs', value=DEFAULT_TAB, className='custom-tabs-container', 
+                                children=[
+                                    dcc.Tab(label='Table', value='tab_1', className='custom-tab', selected_className='custom-tab--selected'),
+                                    dcc.Tab(label='Club Stats', value='tab_2', className='custom-tab', selected_className='custom-tab--selected')
+                                    ]),
+                            dash_table.DataTable(
+                                id='table_table',
+                                columns=table_cols,
+                                data=table_data,
+                                page_current=0,
+                                page_count=table_pages,
+                                page_size=PAGE_SIZE,
+                                page_action='custom',
+                                sort_action='custom',
+                                sort_mode='multi',
+                                sort_by=[],
+                                filter_action='custom',
+                                filter_query='',
+                                style_table={'overflowX': 'auto'},
+                                style_header={'backgroundColor': 'purple', 'color': 'white', 'border': '2px solid rgb(242,242,242)'},
+                                style_cell={'backgroundColor': '#f7f9fa', 'textAlign': 'left', 'border': '2px solid rgb(242,242,242)'}
+                                ),
+                            # Row count of the filtered table
+                            html.Div(id='table_total', children=table_total, style={'margin-top': '0.5%'})
+                            ], width=9)], style={'height': '400px'}),
+            # Plot contents
+            dbc.Row(
+                [
+                    dbc.Col(html.Div(
+                        [
+                            html.H5(dbc.Badge('Table Barchart')),
+                            dcc.Graph(id='table_bar', figure=table_barplot(league, DEFAULT_GROUP, season_range, DEFAULT_TABLE_FEATURE))
+                            ], style= {
                                         'border-radius': '10px',
                                         'box-shadow': '5px 5px #e6ebed',
                                         'background': '#f7f9fa',
                                         'padding': '3%',
                                         'margin-left': '0%',
-                                        'margin-bottom': '7%'
-                                        }
-                                    )
-                                ),
-                # Tabs for tables
-                dbc.Col(
-                    [
-                        dcc.Tabs(id='table_tabs', value='tab_1', className='custom-tabs-container', 
-                            children=[
-                                dcc.Tab(label='Table', value='tab_1', className='custom-tab', selected_className='custom-tab--selected'),
-                                dcc.Tab(label='Club Stats', value='tab_2', className='custom-tab', selected_className='custom-tab--selected')
-                                ]),
-                        dcc.Graph(id='table_table')
-                        ], width=9)], style={'height': '320px'}),
-        # Plot contents
-        dbc.Row(
-            [
-                dbc.Col(html.Div(
-                    [
-                        html.H5(dbc.Badge('Table Barchart')),
-                        dcc.Graph(id='table_bar')
-                        ], style= {
-                                    'border-radius': '10px',
-                                    'box-shadow': '5px 5px #e6ebed',
-                                    'background': '#f7f9fa',
-                                    'padding': '3%',
-                                    'margin-left': '0%',
-                                    'margin-bottom': '3.5%'
-                                }
-                            ), width=6
-                        ),
-                dbc.Col(html.Div(
-                    [
-                        html.H5(dbc.Badge('Club Stats Barchart')),
-                        dcc.Graph(id='club_bar')
-                        ], style= {
-                                    'border-radius': '10px',
-                                    'box-shadow': '5px 5px #e6ebed',
-                                    'background': '#f7f9fa',
-                                    'padding': '3%',
-                                    'margin-left': '0%',
-                                    'margin-bottom': '3.5%'
-                                }
-                            ), width=6
-                        ),
-                dbc.Col(html.Div(
-                    [
-                        html.H5(dbc.Badge('Table Timeseries')),
-                        dcc.Graph(id='table_timeseries')
+                                        'margin-bottom': '3.5%'
+                                    }
+                                ), width=6
+                            ),
+                    dbc.Col(html.Div(
+                        [
+                            html.H5(dbc.Badge('Club Stats Barchart')),
+                            dcc.Graph(id='club_bar', figure=club_barplot(league, DEFAULT_GROUP, season_range, DEFAULT_CLUB_FEATURE))
+                            ], style= {
+                                        'border-radius': '10px',
+                                        'box-shadow': '5px 5px #e6ebed',
+                                        'background': '#f7f9fa',
+                                        'padding': '3%',
+                                        'margin-left': '0%',
+                                        'margin-bottom': '3.5%'
+                                    }
+                                ), width=6
+                            ),
+                    dbc.Col(html.Div(
+                        [
+                            html.H5(dbc.Badge('Table Timeseries')),
+                            dcc.Graph(id='table_timeseries', figure=table_timeSplot(league, DEFAULT_GROUP, season_range, DEFAULT_TABLE_FEATURE,
+                                                                                  DEFAULT_WINDOW_STAT, DEFAULT_WINDOW_SIZE))
+                            ], style= {
+                                        'border-radius': '10px',
+                                        'box-shadow': '5px 5px #e6ebed',
+                                        'background': '#f7f9fa',
+                                        'padding': '3%',
+                                        'margin-left': '0%',
+                                        'margin-bottom': '1%'
+                                    }
+                                ), width=6
+                            ),
+                    dbc.Col(html.Div(
+                        [
+                            html.H5(dbc.Badge('Club Stats Timeseries')),
+                            dcc.Graph(id='club_timeseries', figure=club_timeSplot(league, DEFAULT_GROUP, season_range, DEFAULT_CLUB_FEATURE,
+                                                                                DEFAULT_WINDOW_STAT, DEFAULT_WINDOW_SIZE))
                         ], style= {
-                                    'border-radius': '10px',
-                                    'box-shadow': '5px 5px #e6ebed',
-                                    'background': '#f7f9fa',
-                                    'padding': '3%',
-                                    'margin-left': '0%',
-                                    'margin-bottom': '1%'
-                                }
-                            ), width=6
-                        ),
-                dbc.Col(html.Div(
-                    [
-                        html.H5(dbc.Badge('Club Stats Timeseries')),
-                        dcc.Graph(id='club_timeseries')
-                    ], style= {
-                                    'border-radius': '10px',
-                                    'box-shadow': '5px 5px #e6ebed',
-                                    'background': '#f7f9fa',
-                                    'padding': '3%',
-                                    'margin-left': '0%',
-                                    'margin-bottom': '1%'
-                                }
-                            ), width=6
-                        )
-            ]
-        )
-    ], style={'padding':'3%'}
-)
+                                        'border-radius': '10px',
+                                        'box-shadow': '5px 5px #e6ebed',
+                                        'background': '#f7f9fa',
+                                        'padding': '3%',
+                                        'margin-left': '0%',
+                                        'margin-bottom': '1%'
+                                    }
+                                ), width=6
+                            )
+                ]
+            ),
+            # Club comparison
+            dbc.Row(
+                [
+                    dbc.Col(html.Div(
+                        [
+                            html.H5(dbc.Badge('Club Comparison')),
+                            dbc.Row(
+                                [
+                                    dbc.Col(dcc.Dropdown(id='club_select', options=[
+                                                                                {'label': club, 'value': club}
+                                                                                for club in state.data.clubs
+                                                                                ],
+                                                                    value=compare_clubs, multi=True,
+                                                                    placeholder='Select clubs to compare'), width=8),
+                                    dbc.Col(dcc.Dropdown(id='compare_dropdown', options=[
+                                                                                {'label': i, 'value': i}
+                                                                                for i in FEATURES
+                                                                                ],
+                                                                    value=DEFAULT_COMPARE_FEATURE,
+                                                                    clearable=False), width=4)
+                                ]),
+                            dcc.Graph(id='club_compare',
+                                      figure=club_compare(league, compare_clubs, season_range, DEFAULT_COMPARE_FEATURE))
+                            ], style= {
+                                        'border-radius': '10px',
+                                        'box-shadow': '5px 5px #e6ebed',
+                                        'background': '#f7f9fa',
+                                        'padding': '3%',
+                                        'margin-left': '0%',
+                                        'margin-top': '3.5%'
+                                    }
+                                ), width=12
+                            )
+                ]
+            ),
+            # Club statistics analytics
+            dbc.Row(
+                [
+                    dbc.Col(html.Div(
+                        [
+                            html.H5(dbc.Badge('Club Stats Correlation')),
+                            dcc.Graph(id='correlation_heatmap',
+                                      figure=correlation_heatmap(league, DEFAULT_GROUP, season_range))
+                            ], style= {
+                                        'border-radius': '10px',
+                                        'box-shadow': '5px 5px #e6ebed',
+                                        'background': '#f7f9fa',
+                                        'padding': '3%',
+                                        'margin-left': '0%',
+                                        'margin-top': '7%'
+                                    }
+                                ), width=6
+                            ),
+                    dbc.Col(html.Div(
+                        [
+                            html.H5(dbc.Badge('Top 4 Separability')),
+                            dcc.Graph(id='separability_bar', figure=separability_ranking(league, season_range))
+                            ], style= {
+                                        'border-radius': '10px',
+                                        'box-shadow': '5px 5px #e6ebed',
+                                        'background': '#f7f9fa',
+                                        'padding': '3%',
+                                        'margin-left': '0%',
+                                        'margin-top': '7%'
+                                    }
+                                ), width=6
+                            )
+                ]
+            ),
+            # Top 4 forecast
+            dbc.Row(
+                [
+                    dbc.Col(html.Div(
+                        [
+                            html.H5(dbc.Badge('Top 4 Forecast')),
+                            dcc.Graph(id='forecast_bar', figure=top4_probabilities(league, season_range))
+                            ], style= {
+                                        'border-radius': '10px',
+                                        'box-shadow': '5px 5px #e6ebed',
+                                        'background': '#f7f9fa',
+                                        'padding': '3%',
+                                        'margin-left': '0%',
+                                        'margin-top': '3.5%'
+                                    }
+                                ), width=12
+                            )
+                ]
+            ),
+            # Per-season aggregates for the clientside charts
+            dcc.Store(id='season_aggregates', data=client_aggregates(league) if CLIENTSIDE_CHARTS else None)
+        ], style={'padding':'3%'}
+    )
 
-app.layout = row
+def client_aggregates(league):
+    state = league_state(league)
+    payload = state.cube.client_payload()
+    payload['club_first_season'] = state.club_first_season
+    payload['layout'] = BASE_LAYOUT
+    return payload
 
 # Callbacks
-@app.callback(
-    Output('table_bar','figure'),
-    [
-        Input('choose_group', 'value'),
-        Input('season_slider', 'value'),
-        Input('table_dropdown', 'value')
-        ])
-def table_barplot(choose_group, season_slider, table_dropdown):
-    fig = go.Figure(layout={'plot_bgcolor': 'rgba(0,0,0,0)', 'paper_bgcolor': 'rgba(0,0,0,0)'})
-    title_plot = str(table_dropdown) + ' from '+ str(season_slider[0]) + '~' + str(season_slider[1])
-    fig.update_layout(title={
-                            'text': title_plot, 
-                            'y': 0.9, 
-                            'x': 0.9,
-                            'font': {'size': 20}
-                        },
-                        margin=dict(t=5, b=5), 
-                        legend=dict(x=-.1, y=1.2))
-    fig.update_xaxes(showgrid=True, gridwidth=3, gridcolor='rgb(242,242,242,242)')
-    fig.update_yaxes(showgrid=True, gridwidth=3, gridcolor='rgb(242,242,242,242)')
-    if len(choose_group) == 2:
-        years = []
-        avg_feature_top4 = []
-        avg_feature_below4 = []
-        for year in range(season_slider[0], season_slider[1]+1):
-            years.append(year)
-            for goal in top4[top4['season'] == str(year)].loc[:, table_dropdown]:
-                avg_feature_top4.append(goal)
-            for goal in below4[below4['season'] == str(year)].loc[:, table_dropdown]:
-                avg_feature_below4.append(goal)
-        fig.add_trace(go.Bar(
-            x = pd.Series(avg_feature_top4).value_counts().sort_index().index,
-            y = pd.Series(avg_feature_top4).value_counts().sort_index(),
-            marker_color = 'purple',
-            name='Top 4'
-        ))
-        fig.add_trace(go.Bar(
-            x = pd.Series(avg_feature_below4).value_counts().sort_index().index,
-            y = pd.Series(avg_feature_below4).value_counts().sort_index(),
-            marker_color = 'navy',
-            name='Below 4'
-        ))
-        return fig.update_layout(barmode='stack')
-    else:
-        years = []
-        avg_feature = []
-        if choose_group == [1]:
-            for year in range(season_slider[0], season_slider[1]+1):
-                years.append(year)
-                for goal in top4[top4['season'] == str(year)].loc[:, table_dropdown]:
-                    avg_feature.append(goal)
-            fig.add_trace(go.Bar(
-                x = pd.Series(avg_feature).value_counts().sort_index().index,
-                y = pd.Series(avg_feature).value_counts().sort_index(),
-                marker_color = 'purple',
-                name = 'Top 4'
-            ))
-            return fig
-        else:
-            for year in range(season_slider[0], season_slider[1]+1):
-                years.append(year)
-                for goal in below4[below4['season'] == str(year)].loc[:, table_dropdown]:
-                    avg_feature.append(goal)
-            fig.add_trace(go.Bar(
-                x = pd.Series(avg_feature).value_counts().sort_index().index,
-                y = pd.Series(avg_feature).value_counts().sort_index(),
-                marker_color = 'navy',
-                name = 'Below 4'
-            ))
-            return fig
-
-@app.callback(
-    Output('table_timeseries','figure'),
-    [
-        Input('choose_group', 'value'),
-        Input('season_slider', 'value'),
-        Input('table_dropdown', 'value')
-        ])
-def table_timeSplot(choose_group, season_slider, table_dropdown):
-    fig = go.Figure(layout={'plot_bgcolor': 'rgba(0,0,0,0)', 'paper_bgcolor': 'rgba(0,0,0,0)'})
+def group_traces(choose_group):
+    # Top 4 is drawn first, matching the checklist order
+    return [g for g in GROUPS if g in choose_group]
+
+@callback_metrics.panel
+@figure_cache.memoize
+def table_barplot(league, choose_group, season_slider, table_dropdown):
     title_plot = str(table_dropdown) + ' from '+ str(season_slider[0]) + '~' + str(season_slider[1])
-    fig.update_layout(title={
-                            'text': title_plot, 
-                            'y': 0.9, 
-                            'x': 0.9,
-                            'font': {'size': 20}
-                        },
-                        margin=dict(t=5, b=5), 
-                        legend=dict(x=-.1, y=1.2))
-    fig.update_xaxes(showgrid=True, gridwidth=3, gridcolor='rgb(242,242,242,242)')
-    fig.update_yaxes(showgrid=True, gridwidth=3, gridcolor='rgb(242,242,242,242)')
-    if len(choose_group) == 2:
-        years = []
-        avg_feature_top4 = []
-        avg_feature_below4 = []
-        for year in range(season_slider[0], season_slider[1]+1):
-            years.append(year)
-            avg_feature_top4.append(top4[top4['season'] == str(year)].loc[:, table_dropdown].mean())
-            avg_feature_below4.append(below4[below4['season'] == str(year)].loc[:, table_dropdown].mean())
-        
-        fig.add_trace(go.Scatter(
-            x = years,
-            y = avg_feature_top4,
-            marker_color = 'purple',
-            name='Top 4'
-        ))
-        fig.add_trace(go.Scatter(
-            x = years,
-            y = avg_feature_below4,
-            marker_color = 'navy',
-            name='Below 4'
-        ))
-        return fig
-    else:
-        years = []
-        avg_feature = []
-        if choose_group == [1]:
-            for year in range(season_slider[0], season_slider[1]+1):
-                years.append(year)
-                avg_feature.append(top4[top4['season'] == str(year)].loc[:, table_dropdown].mean())
-            fig.add_trace(go.Scatter(
-                x = years,
-                y = avg_feature,
-                marker_color = 'purple',
-                name = 'Top 4'
-            ))
-            return fig
-        else:
-            for year in range(season_slider[0], season_slider[1]+1):
-                years.append(year)
-                avg_feature.append(below4[below4['season'] == str(year)].loc[:, table_dropdown].mean())
-            fig.add_trace(go.Scatter(
-                x = years,
-                y = avg_feature,
-                marker_color = 'navy',
-                name = 'Below 4'
-            ))
-            return fig
-
-@app.callback(
-    Output('club_bar','figure'),
-    [
-        Input('choose_group', 'value'),
-        Input('season_slider', 'value'),
-        Input('club_dropdown', 'value')
-        ])
-def club_barplot(choose_group, season_slider, club_dropdown):
-    fig = go.Figure(layout={'plot_bgcolor': 'rgba(0,0,0,0)', 'paper_bgcolor': 'rgba(0,0,0,0)'})
-    f_year_club = 2011
-    if season_slider[0] > 2011:
-        f_year_club = season_slider[0]
-    title_plot = str(club_dropdown) + ' from '+ str(f_year_club) + '~' + str(season_slider[1])
-    fig.update_layout(title={
-                            'text': title_plot, 
-                            'y': 0.9, 
-                            'x': 0.9,
-                            'font': {'size': 20}
-                        },
-                        margin=dict(t=5, b=5), 
-                        legend=dict(x=-.1, y=1.2))
-    fig.update_xaxes(showgrid=True, gridwidth=3, gridcolor='rgb(242,242,242,242)')
-    fig.update_yaxes(showgrid=True, gridwidth=3, gridcolor='rgb(242,242,242,242)')
-
-    if len(choose_group) == 2:
-        years = []
-        avg_feature_top4 = []
-        avg_feature_below4 = []
-        for year in range(f_year_club, season_slider[1]+1):
-            years.append(year)
-            for goal in top4[top4['season'] == str(year)].loc[:, club_dropdown]:
-                avg_feature_top4.append(goal)
-            for goal in below4[below4['season'] == str(year)].loc[:, club_dropdown]:
-                avg_feature_below4.append(goal)
-
-        fig.add_trace(go.Bar(
-            x = pd.Series(avg_feature_top4).value_counts().sort_index().index,
-            y = pd.Series(avg_feature_top4).value_counts().sort_index(),
-            marker_color = 'purple',
-            name='Top 4'
-        ))
-        fig.add_trace(go.Bar(
-            x = pd.Series(avg_feature_below4).value_counts().sort_index().index,
-            y = pd.Series(avg_feature_below4).value_counts().sort_index(),
-            marker_color = 'navy',
-            name='Below 4'
-        ))
-        return fig.update_layout(barmode='stack')
-    else:
-        years = []
-        avg_feature = []
-        if choose_group == [1]:
-            for year in range(f_year_club, season_slider[1]+1):
-                years.append(year)
-                for goal in top4[top4['season'] == str(year)].loc[:, club_dropdown]:
-                    avg_feature.append(goal)
-            fig.add_trace(go.Bar(
-                x = pd.Series(avg_feature).value_counts().sort_index().index,
-                y = pd.Series(avg_feature).value_counts().sort_index(),
-                marker_color = 'purple',
-                name = 'Top 4'
-            ))
-            return fig
-        else:
-            for year in range(f_year_club, season_slider[1]+1):
-                years.append(year)
-                for goal in below4[below4['season'] == str(year)].loc[:, club_dropdown]:
-                    avg_feature.append(goal)
-            fig.add_trace(go.Bar(
-                x = pd.Series(avg_feature).value_counts().sort_index().index,
-                y = pd.Series(avg_feature).value_counts().sort_index(),
-                marker_color = 'navy',
-                name = 'Below 4'
-            ))
-            return fig
-
-@app.callback(
-    Output('club_timeseries','figure'),
-    [
-        Input('choose_group', 'value'),
-        Input('season_slider', 'value'),
-        Input('club_dropdown', 'value')
-        ])
-def club_timeSplot(choose_group, season_slider, club_dropdown):
-    fig = go.Figure(layout={'plot_bgcolor': 'rgba(0,0,0,0)', 'paper_bgcolor': 'rgba(0,0,0,0)'})
-    f_year_club = 2011
-    if season_slider[0] > 2011:
-        f_year_club = season_slider[0]
+    groups = group_traces(choose_group)
+    values, counts, width = league_state(league).cube.histogram(groups, table_dropdown, season_slider[0], season_slider[1])
+    return bar_figure(title_plot, values, zip(groups, counts), width)
+
+def stat_title(feature, window_stat, window_size):
+    if window_stat == 'mean':
+        return str(feature)
+    if window_stat == 'expanding_mean':
+        return str(feature) + ' expanding mean'
+    return '%s %s (%d seasons)' % (feature, window_stat.replace('_', ' '), window_size)
+
+@callback_metrics.panel
+@figure_cache.memoize
+def table_timeSplot(league, choose_group, season_slider, table_dropdown, window_stat=DEFAULT_WINDOW_STAT,
+                    window_size=DEFAULT_WINDOW_SIZE):
+    title_plot = stat_title(table_dropdown, window_stat, window_size) + ' from '+ str(season_slider[0]) + '~' + str(season_slider[1])
+    cube = league_state(league).cube
+    years = cube.years(season_slider[0], season_slider[1])
+    return line_figure(title_plot, years, [
+        (group, cube.window_stats(table_dropdown, group, season_slider[0], season_slider[1], window_stat, window_size))
+        for group in group_traces(choose_group)
+    ])
+
+@callback_metrics.panel
+@figure_cache.memoize
+def club_barplot(league, choose_group, season_slider, club_dropdown):
+    state = league_state(league)
+    f_year_club = max(state.club_first_season, season_slider[0])
     title_plot = str(club_dropdown) + ' from '+ str(f_year_club) + '~' + str(season_slider[1])
-    fig.update_layout(title={
-                            'text': title_plot, 
-                            'y': 0.9, 
-                            'x': 0.9,
-                            'font': {'size': 20}
-                        },
-                        margin=dict(t=5, b=5), 
-                        legend=dict(x=-.1, y=1.2))
-    fig.update_xaxes(showgrid=True, gridwidth=3, gridcolor='rgb(242,242,242,242)')
-    fig.update_yaxes(showgrid=True, gridwidth=3, gridcolor='rgb(242,242,242,242)')
-    if len(choose_group) == 2:
-        years = []
-        avg_feature_top4 = []
-        avg_feature_below4 = []
-        for year in range(f_year_club, season_slider[1]+1):
-            years.append(year)
-            avg_feature_top4.append(top4[top4['season'] == str(year)].loc[:, club_dropdown].mean())
-            avg_feature_below4.append(below4[below4['season'] == str(year)].loc[:, club_dropdown].mean())
-        
-        fig.add_trace(go.Scatter(
-            x = years,
-            y = avg_feature_top4,
-            marker_color = 'purple',
-            name='Top 4'
-        ))
-        fig.add_trace(go.Scatter(
-            x = years,
-            y = avg_feature_below4,
-            marker_color = 'navy',
-            name="Below 4"
-        ))
-        return fig
-    else:
-        years = []
-        mean_val = []
-        avg_feature = []
-        if choose_group == [1]:
-            for year in range(f_year_club, season_slider[1]+1):
-                years.append(year)
-                for value in top4[top4['season'] == str(year)].loc[:, club_dropdown]:
-                    mean_val.append(value)
-                avg_feature.append(np.mean(mean_val))
-            fig.add_trace(go.Scatter(
-                x = years,
-                y = avg_feature,
-                marker_color = 'purple',
-                name = 'Top 4'
-            ))
-            return fig
-        else:
-            for year in range(f_year_club, season_slider[1]+1):
-                years.append(year)
-                for value in below4[below4['season'] == str(year)].loc[:, club_dropdown]:
-                    mean_val.append(value)
-                avg_feature.append(np.mean(mean_val))
-            fig.add_trace(go.Scatter(
-                x = years,
-                y = avg_feature,
-                marker_color = 'navy',
-                name = 'Below 4'
-            ))
-            return fig
-
-@app.callback(
-    Output('table_table', 'figure'),
-    [
-        Input('table_tabs','value'),
-        Input('season_slider', 'value'),
-        Input('choose_group', 'value')
+    groups = group_traces(choose_group)
+    values, counts, width = state.cube.histogram(groups, club_dropdown, f_year_club, season_slider[1])
+    return bar_figure(title_plot, values, zip(groups, counts), width)
+
+@callback_metrics.panel
+@figure_cache.memoize
+def club_timeSplot(league, choose_group, season_slider, club_dropdown, window_stat=DEFAULT_WINDOW_STAT,
+                   window_size=DEFAULT_WINDOW_SIZE):
+    state = league_state(league)
+    cube = state.cube
+    f_year_club = max(state.club_first_season, season_slider[0])
+    title_plot = stat_title(club_dropdown, window_stat, window_size) + ' from '+ str(f_year_club) + '~' + str(season_slider[1])
+    years = cube.years(f_year_club, season_slider[1])
+    return line_figure(title_plot, years, [
+        (group, cube.window_stats(club_dropdown, group, f_year_club, season_slider[1], window_stat, window_size))
+        for group in group_traces(choose_group)
     ])
-def show_table(table_tabs, season_slider, choose_group):
-    fig = go.Figure()
-    fig.update_layout(margin=dict(t=0, b=186, l=0, r=0))
-    # Something wrong with pandas datetime
-    if table_tabs == 'tab_1':
-        if len(choose_group) == 2:
-            t_df = df[(df['season'] >= season_slider[0]) & (df['season'] <= season_slider[1])]
-            fig.add_trace(go.Table(header=dict(
-                                                values=[
-                                                        'club_name', 'won', 'drawn', 'lost', 'goal',
-                                                        'goal_against', 'points', 'position', 'season'
-                                                        ],
-                                                fill_color='purple', font_color='white', line_color='rgb(242,242,242,242)',
-                                                align='left'),
-                                    cells=dict(values=[
-                                                        t_df.club_name, t_df.won, t_df.drawn, t_df.lost, t_df.goal, 
-                                                        t_df.goal_against, t_df.points, t_df.position, t_df.season
-                                                        ],
-                                    fill_color= '#f7f9fa', line_color='rgb(242,242,242,242)', line={'width': 2},
-                                    align='left')))
-            return fig
-        elif choose_group == [1]:
-            t_df = df[(df['season'] >= season_slider[0]) & (df['season'] <= season_slider[1]) & (df['is_top4'] == 1)]
-            fig.add_trace(go.Table(header=dict(
-                                                values=[
-                                                        'club_name', 'won', 'drawn', 'lost', 'goal',
-                                                        'goal_against', 'points', 'position', 'season'
-                                                        ],
-                                                fill_color='purple', font_color='white', line_color='rgb(242,242,242,242)',
-                                                align='left'),
-                                    cells=dict(values=[
-                                                        t_df.club_name, t_df.won, t_df.drawn, t_df.lost, t_df.goal, 
-                                                        t_df.goal_against, t_df.points, t_df.position, t_df.season
-                                                        ],
-                                    fill_color= '#f7f9fa', line_color='rgb(242,242,242,242)', line={'width': 2},
-                                    align='left')))
-            return fig 
-        else:
-            t_df = df[(df['season'] >= season_slider[0]) & (df['season'] <= season_slider[1]) & (df['is_top4'] == 0)]
-            fig.add_trace(go.Table(header=dict(
-                                                values=[
-                                                        'club_name', 'won', 'drawn', 'lost', 'goal',
-                                                        'goal_against', 'points', 'position', 'season'
-                                                        ],
-                                                fill_color='purple', font_color='white', line_color='rgb(242,242,242,242)',
-                                                align='left'),
-                                    cells=dict(values=[
-                                                        t_df.club_name, t_df.won, t_df.drawn, t_df.lost, t_df.goal, 
-                                                        t_df.goal_against, t_df.points, t_df.position, t_df.season
-                                                        ],
-                                    fill_color= '#f7f9fa', line_color='rgb(242,242,242,242)', line={'width': 2},
-                                    align='left')))
-            return fig 
-    else:
-        if len(choose_group) == 2:
-            t_df = df[(df['season'] >= season_slider[0]) & (df['season'] <= season_slider[1])]
-            fig.add_trace(go.Table(header=dict(
-                                                values=[
-                                                        'Club Name', 'Aerial Battle', 'Big Chance Created', 'Clearance', 
-                                                        'Cross', 'Cross Accuracy', 'Goal Conceded/match', 'Goal/match',
-                                                        'Interceptions', 'Pass Accuracy', 'Pass per game', 'Shooting Accuracy',
-                                                        'Shot on Target', 'Tackle success', 'Position'
-                                                        ],
-                                                fill_color='purple', font_color='white', line_color='rgb(242,242,242,242)',
-                                                align='left'),
-                                    cells=dict(values=[
-                                                        t_df.club_name, t_df.aerial_battles, t_df.big_chance_created, t_df.clearance,
-                                                        t_df.cross, t_df.cross_accuracy, t_df.goal_conceded_per_match, 
-                                                        t_df.goal_per_match, t_df.interceptions, t_df.pass_accuracy,
-                                                        t_df.pass_per_game, t_df.shooting_accuracy, t_df.shot_on_target,
-                                                        t_df.tackle_success, t_df.position
-                                                        ],
-                                    fill_color= '#f7f9fa', line_color='rgb(242,242,242,242)', line={'width': 2},
-                                    align='left')))
-            return fig 
-        elif choose_group == [1]:
-            t_df = df[(df['season'] >= season_slider[0]) & (df['season'] <= season_slider[1]) & (df['is_top4'] == 1)]
-            fig.add_trace(go.Table(header=dict(
-                                                values=[
-                                                        'Club Name', 'Aerial Battle', 'Big Chance Created', 'Clearance', 
-                                                        'Cross', 'Cross Accuracy', 'Goal Conceded/match', 'Goal/match',
-                                                        'Interceptions', 'Pass Accuracy', 'Pass per game', 'Shooting Accuracy',
-                                                        'Shot on Target', 'Tackle success', 'Position'
-                                                        ],
-                                                fill_color='purple', font_color='white', line_color='rgb(242,242,242,242)',
-                                                align='left'),
-                                    cells=dict(values=[
-                                                        t_df.club_name, t_df.aerial_battles, t_df.big_chance_created, t_df.clearance,
-                                                        t_df.cross, t_df.cross_accuracy, t_df.goal_conceded_per_match, 
-                                                        t_df.goal_per_match, t_df.interceptions, t_df.pass_accuracy,
-                                                        t_df.pass_per_game, t_df.shooting_accuracy, t_df.shot_on_target,
-                                                        t_df.tackle_success, t_df.position
-                                                        ],
-                                    fill_color= '#f7f9fa', line_color='rgb(242,242,242,242)', line={'width': 2},
-                                    align='left')))
-            return fig 
-        else:
-            t_df = df[(df['season'] >= season_slider[0]) & (df['season'] <= season_slider[1]) & (df['is_top4'] == 0)]
-            fig.add_trace(go.Table(header=dict(
-                                                values=[
-                                                        'Club Name', 'Aerial Battle', 'Big Chance Created', 'Clearance', 
-                                                        'Cross', 'Cross Accuracy', 'Goal Conceded/match', 'Goal/match',
-                                                        'Interceptions', 'Pass Accuracy', 'Pass per game', 'Shooting Accuracy',
-                                                        'Shot on Target', 'Tackle success', 'Position'
-                                                        ],
-                                                fill_color='purple', font_color='white', line_color='rgb(242,242,242,242)',
-                                                align='left'),
-                                    cells=dict(values=[
-                                                        t_df.club_name, t_df.aerial_battles, t_df.big_chance_created, t_df.clearance,
-                                                        t_df.cross, t_df.cross_accuracy, t_df.goal_conceded_per_match, 
-                                                        t_df.goal_per_match, t_df.interceptions, t_df.pass_accuracy,
-                                                        t_df.pass_per_game, t_df.shooting_accuracy, t_df.shot_on_target,
-                                                        t_df.tackle_success, t_df.position
-                                                        ],
-                                    fill_color= '#f7f9fa', line_color='rgb(242,242,242,242)', line={'width': 2},
-                                    align='left')))
-            return fig 
 
+@callback_metrics.panel
+@figure_cache.memoize
+def club_compare(league, club_select, season_slider, compare_dropdown):
+    # Per-club series come from the club index: O(rows of the selected clubs)
+    state = league_state(league)
+    data = state.data
+    f_year = season_slider[0]
+    if compare_dropdown in CLUB_FEATURES:
+        f_year = max(state.club_first_season, f_year)
+    title_plot = str(compare_dropdown) + ' from '+ str(f_year) + '~' + str(season_slider[1])
+    series = []
+    for club in club_select or []:
+        if club in data.club_codes:
+            seasons, values = data.club_series(club, compare_dropdown, f_year, season_slider[1])
+            series.append((club, seasons, values))
+    return series_figure(title_plot, series)
+
+@callback_metrics.panel
+@figure_cache.memoize
+def correlation_heatmap(league, choose_group, season_slider):
+    # From the cube's per-season cross products: O(features^2) per window
+    state = league_state(league)
+    f_year_club = max(state.club_first_season, season_slider[0])
+    title_plot = 'correlation from '+ str(f_year_club) + '~' + str(season_slider[1])
+    corr = state.cube.correlation(group_traces(choose_group), CLUB_FEATURES, f_year_club, season_slider[1])
+    return heatmap_figure(title_plot, CLUB_FEATURES, corr)
+
+@callback_metrics.panel
+@figure_cache.memoize
+def separability_ranking(league, season_slider):
+    # Club stats ranked by how far apart Top 4 and Below 4 are (|Cohen's d|)
+    state = league_state(league)
+    f_year_club = max(state.club_first_season, season_slider[0])
+    title_plot = 'effect size from '+ str(f_year_club) + '~' + str(season_slider[1])
+    effect = state.cube.effect_sizes(CLUB_FEATURES, f_year_club, season_slider[1])
+    order = np.argsort(-np.abs(np.nan_to_num(effect)), kind='mergesort')
+    return ranking_figure(title_plot, [CLUB_FEATURES[i] for i in order], effect[order])
+
+@callback_metrics.panel
+@figure_cache.memoize
+def top4_probabilities(league, season_slider):
+    # Forecast for the last season of the range; scored once per dataset
+    # version by top4_forecast
+    title_plot = 'top 4 probability in ' + str(season_slider[1])
+    data = league_state(league).data
+    forecast = top4_forecast.season(data, season_slider[1]) if top4_forecast else None
+    if forecast is None:
+        return ranking_figure(title_plot + ' (not available)', [], [])
+    clubs, probabilities = forecast
+    return ranking_figure(title_plot, clubs, probabilities, [1] * 4 + [0] * (len(clubs) - 4))
+
+def table_rows(data, season_slider, choose_group):
+    # Offsets of the dataset rows shown in the table tabs
+    group = None
+    if len(choose_group) != 2:
+        group = 1 if choose_group == [1] else 0
+    return data.season_index.rows_between(season_slider[0], season_slider[1], group)
+
+def table_total(total, page, page_size):
+    if not total:
+        return 'No rows'
+    return '%d rows, page %d of %d' % (total, page + 1, (total - 1) // page_size + 1)
+
+@callback_metrics.panel
+@figure_cache.memoize
+def show_table(league, table_tabs, season_slider, choose_group, page_current=0, page_size=PAGE_SIZE, sort_by=None,
+               filter_query=''):
+    # Filtering, sorting and paging happen server side. Returns the records,
+    # columns, the page actually shown (a page past the end is clamped to the
+    # last one), the page count and the row count label.
+    data = league_state(league).data
+    rows = query_rows(data, table_rows(data, season_slider, choose_group), filter_query, sort_by)
+    page_size = page_size or PAGE_SIZE
+    page_count = max((len(rows) - 1) // page_size + 1, 1)
+    page = min(page_current or 0, page_count - 1)
+    return (page_records(data, rows, table_tabs, page, page_size), table_columns(table_tabs), page, page_count,
+            table_total(len(rows), page, page_size))
+
+def table_page(page_current):
+    # Any change other than paging (range, group, tab, sort, filter) starts
+    # again from the first page
+    return page_current if triggered_props() <= {'table_table.page_current'} else 0
+
+def triggered_props():
+    # 'id.property' of the inputs the current request has to treat as
+    # changed: its own and those of older requests it supersedes
+    if not flask.has_request_context():
+        return set()
+    props = set(t['prop_id'] for t in dash.callback_context.triggered) | superseded_requests.changed_props()
+    return props - {'.'}
+
+def triggered_ids():
+    # Components whose change fired the current callback; empty on the
+    # initial call or outside a Dash request
+    if not flask.has_request_context():
+        return set()
+    ids = set(t['prop_id'].split('.')[0] for t in dash.callback_context.triggered)
+    return ids - {''}
+
+def initial_call():
+    # Dash fires every callback once when the page loads; the served layout
+    # already holds those outputs
+    return flask.has_request_context() and not triggered_ids()
+
+def update_dashboard(choose_group, season_slider, table_dropdown, club_dropdown, window_stat, window_size,
+                     club_select, compare_dropdown, table_tabs, page_current, page_size, sort_by, filter_query, league):
+    # All panels in one request. Outputs whose inputs did not change
+    # are left as they are, so a dropdown change only redraws its two charts.
+    # A newer request from the same session stops this one between panels.
+    if initial_call():
+        raise PreventUpdate
+    # Includes the changes of older requests this one supersedes, so their
+    # panels are redrawn here rather than left stale
+    triggered = set(prop_id.split('.')[0] for prop_id in triggered_props())
+    everything = not triggered or bool(triggered & {'choose_group', 'season_slider'})
+    outputs = [dash.no_update] * 13
+    window_changed = bool(triggered & {'window_stat', 'window_size'})
+    if everything or 'table_dropdown' in triggered:
+        superseded_requests.check()
+        outputs[0] = table_barplot(league, choose_group, season_slider, table_dropdown)
+    if everything or 'table_dropdown' in triggered or window_changed:
+        outputs[1] = table_timeSplot(league, choose_group, season_slider, table_dropdown, window_stat, window_size)
+    if everything or 'club_dropdown' in triggered:
+        superseded_requests.check()
+        outputs[2] = club_barplot(league, choose_group, season_slider, club_dropdown)
+    if everything or 'club_dropdown' in triggered or window_changed:
+        outputs[3] = club_timeSplot(league, choose_group, season_slider, club_dropdown, window_stat, window_size)
+    if everything or triggered & {'table_tabs', 'table_table'}:
+        superseded_requests.check()
+        outputs[4:9] = show_table(league, table_tabs, season_slider, choose_group,
+                                  table_page(page_current), page_size, sort_by, filter_query)
+    if not triggered or triggered & {'season_slider', 'club_select', 'compare_dropdown'}:
+        superseded_requests.check()
+        outputs[9] = club_compare(league, club_select, season_slider, compare_dropdown)
+    if everything:
+        superseded_requests.check()
+        outputs[10] = correlation_heatmap(league, choose_group, season_slider)
+        outputs[11] = separability_ranking(league, season_slider)
+        outputs[12] = top4_probabilities(league, season_slider)
+    return outputs
+
+def update_table(table_tabs, season_slider, choose_group, page_current, page_size, sort_by, filter_query, league):
+    # Table callback when the charts are drawn in the browser
+    if initial_call():
+        raise PreventUpdate
+    return show_table(league, table_tabs, season_slider, choose_group, table_page(page_current), page_size, sort_by,
+                      filter_query)
+
+def update_club_compare(season_slider, club_select, compare_dropdown, league):
+    if initial_call():
+        raise PreventUpdate
+    return club_compare(league, club_select, season_slider, compare_dropdown)
+
+def update_analytics(choose_group, season_slider, league):
+    if initial_call():
+        raise PreventUpdate
+    return correlation_heatmap(league, choose_group, season_slider), separability_ranking(league, season_slider)
+
+def update_forecast(season_slider, league):
+    if initial_call():
+        raise PreventUpdate
+    return top4_probabilities(league, season_slider)
+
+def select_league(league):
+    # Resets the season range and club choices to the selected league. The
+    # panels redraw through the season slider, which every panel listens to;
+    # the league itself is passed to them as State.
+    if initial_call():
+        raise PreventUpdate
+    state = league_state(league)
+    season_range = state.season_range()
+    options = [{'label': club, 'value': club} for club in state.data.clubs]
+    outputs = [season_range[0], season_range[1], season_range, options, default_clubs(league)]
+    if CLIENTSIDE_CHARTS:
+        outputs.append(client_aggregates(league))
+    return outputs
+
+# Set once the chart functions exist and before any callback is registered:
+# Dash 1.x validates every callback against the layout, and newer versions
+# build it on assignment, so the layout snapshot is rendered (or restored) here
+app.layout = serve_layout
+startup.mark('layout')
+
+CHART_OUTPUTS = [
+    ('table_bar', 'table_dropdown'),
+    ('table_timeseries', 'table_dropdown'),
+    ('club_bar', 'club_dropdown'),
+    ('club_timeseries', 'club_dropdown')
+]
+TABLE_OUTPUTS = [
+    Output('table_table', 'data'),
+    Output('table_table', 'columns'),
+    Output('table_table', 'page_current'),
+    Output('table_table', 'page_count'),
+    Output('table_total', 'children')
+]
+WINDOW_INPUTS = [Input('window_stat', 'value'), Input('window_size', 'value')]
+COMPARE_INPUTS = [Input('club_select', 'value'), Input('compare_dropdown', 'value')]
+ANALYTICS_OUTPUTS = [Output('correlation_heatmap', 'figure'), Output('separability_bar', 'figure')]
+FORECAST_OUTPUT = Output('forecast_bar', 'figure')
+TABLE_INPUTS = [
+    Input('table_table', 'page_current'),
+    Input('table_table', 'page_size'),
+    Input('table_table', 'sort_by'),
+    Input('table_table', 'filter_query')
+]
+LEAGUE_STATE = [State('league_dropdown', 'value')]
+LEAGUE_OUTPUTS = [
+    Output('season_slider', 'min'),
+    Output('season_slider', 'max'),
+    Output('season_slider', 'value'),
+    Output('club_select', 'options'),
+    Output('club_select', 'value')
+]
+if CLIENTSIDE_CHARTS:
+    LEAGUE_OUTPUTS.append(Output('season_aggregates', 'data'))
+
+app.callback(LEAGUE_OUTPUTS, [Input('league_dropdown', 'value')])(callback_metrics.instrument(select_league))
+
+if CLIENTSIDE_CHARTS:
+    # Charts are implemented in assets/charts.js; only the table is served
+    for chart_id, dropdown_id in CHART_OUTPUTS:
+        inputs = [Input('choose_group', 'value'), Input('season_slider', 'value'), Input(dropdown_id, 'value')]
+        if chart_id.endswith('timeseries'):
+            inputs += WINDOW_INPUTS
+        app.clientside_callback(
+            ClientsideFunction(namespace='charts', function_name=chart_id),
+            Output(chart_id, 'figure'),
+            inputs,
+            [State('season_aggregates', 'data')])
+    app.callback(
+        TABLE_OUTPUTS,
+        [
+            Input('table_tabs','value'),
+            Input('season_slider', 'value'),
+            Input('choose_group', 'value')
+        ] + TABLE_INPUTS, LEAGUE_STATE)(callback_metrics.instrument(superseded_requests.cancellable(update_table)))
+    app.callback(
+        Output('club_compare', 'figure'),
+        [Input('season_slider', 'value')] + COMPARE_INPUTS, LEAGUE_STATE
+        )(callback_metrics.instrument(superseded_requests.cancellable(update_club_compare)))
+    app.callback(
+        ANALYTICS_OUTPUTS,
+        [Input('choose_group', 'value'), Input('season_slider', 'value')], LEAGUE_STATE
+        )(callback_metrics.instrument(superseded_requests.cancellable(update_analytics)))
+    app.callback(
+        FORECAST_OUTPUT,
+        [Input('season_slider', 'value')], LEAGUE_STATE
+        )(callback_metrics.instrument(superseded_requests.cancellable(update_forecast)))
+else:
+    app.callback(
+        [Output(chart_id, 'figure') for chart_id, _ in CHART_OUTPUTS] + TABLE_OUTPUTS + [Output('club_compare', 'figure')]
+        + ANALYTICS_OUTPUTS + [FORECAST_OUTPUT],
+        [
+            Input('choose_group', 'value'),
+            Input('season_slider', 'value'),
+            Input('table_dropdown', 'value'),
+            Input('club_dropdown', 'value')
+        ] + WINDOW_INPUTS + COMPARE_INPUTS + [Input('table_tabs','value')] + TABLE_INPUTS,
+        LEAGUE_STATE)(callback_metrics.instrument(superseded_requests.cancellable(update_dashboard)))
+startup.mark('callbacks')
+
+
+def common_inputs(league=DEFAULT_LEAGUE):
+    # Input combinations worth pre-rendering: the default league's full season
+    # range for every group choice and dropdown feature. Other leagues are
+    # loaded and rendered on first use.
+    full_range = league_state(league).season_range()
+    for choose_group in [[1, 0], [1], [0]]:
+        for feature in TABLE_FEATURES:
+            yield table_barplot, (league, choose_group, full_range, feature)
+            yield table_timeSplot, (league, choose_group, full_range, feature)
+        for feature in CLUB_FEATURES:
+            yield club_barplot, (league, choose_group, full_range, feature)
+            yield club_timeSplot, (league, choose_group, full_range, feature)
+        for tab in ['tab_1', 'tab_2']:
+            yield show_table, (league, tab, full_range, choose_group, 0, PAGE_SIZE, [], '')
+
+def warm_cache():
+    with startup.phase('warm cache'):
+        for callback, args in common_inputs():
+            callback(*args)
+    # The first fast-start worker without a usable snapshot leaves one for
+    # the workers after it
+    if FAST_START and startup_snapshot is None:
+        save_startup_snapshot()
+    ready.set()
+    return figure_cache.stats()
 
 
 if __name__ == '__main__':
-    app.run_server()
\ No newline at end of file
+    if sys.argv[1:] == ['warm']:
+        print(warm_cache())
+    elif sys.argv[1:] == ['snapshot']:
+        warm_cache()
+        save_startup_snapshot()
+        print('Saved startup snapshot for catalog %s' % store.version)
+    elif sys.argv[1:] == ['profile']:
+        warm_cache()
+        print(startup.report())
+    else:
+        warm_cache()
+        app.run_server()
\ No newline at end of file
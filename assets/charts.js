@@ -0,0 +1,147 @@
+// Clientside versions of the chart callbacks in app.py.
+// They read the per-season aggregates from the 'season_aggregates' store, so
+// group toggles and slider moves are handled without a server round trip.
+(function() {
+    var GROUPS = [1, 0];
+    var GROUP_NAMES = {1: 'Top 4', 0: 'Below 4'};
+    var GROUP_COLORS = {1: 'purple', 0: 'navy'};
+
+    function lowerBound(arr, value) {
+        var lo = 0, hi = arr.length;
+        while (lo < hi) {
+            var mid = (lo + hi) >> 1;
+            if (arr[mid] < value) { lo = mid + 1; } else { hi = mid; }
+        }
+        return lo;
+    }
+
+    function seasonSlice(agg, lo, hi) {
+        return [lowerBound(agg.seasons, lo), lowerBound(agg.seasons, hi + 1)];
+    }
+
+    function selectedGroups(chooseGroup) {
+        return GROUPS.filter(function(g) { return chooseGroup.indexOf(g) !== -1; });
+    }
+
+    function baseFigure(agg, title) {
+        // agg.layout is figures.BASE_LAYOUT from the server
+        var layout = JSON.parse(JSON.stringify(agg.layout));
+        layout.title.text = title;
+        return {data: [], layout: layout};
+    }
+
+    function barFigure(agg, chooseGroup, feature, lo, hi) {
+        var fig = baseFigure(agg, feature + ' from ' + lo + '~' + hi);
+        var f = agg.features[feature];
+        var range = seasonSlice(agg, lo, hi);
+        var groups = selectedGroups(chooseGroup);
+        var counts = groups.map(function(g) {
+            var cum = f.cum_hist[g];
+            return cum[range[1]].map(function(c, b) { return c - cum[range[0]][b]; });
+        });
+        // Drop bins that are empty for every selected group
+        var keep = f.bins.map(function(_, b) {
+            return counts.some(function(row) { return row[b] > 0; });
+        });
+        groups.forEach(function(g, i) {
+            fig.data.push({
+                type: 'bar',
+                x: f.bins.filter(function(_, b) { return keep[b]; }),
+                y: counts[i].filter(function(_, b) { return keep[b]; }),
+                width: f.width,
+                marker: {color: GROUP_COLORS[g]},
+                name: GROUP_NAMES[g]
+            });
+        });
+        fig.layout.barmode = 'stack';
+        return fig;
+    }
+
+    function statTitle(feature, stat, size) {
+        if (stat === 'mean') { return feature; }
+        if (stat === 'expanding_mean') { return feature + ' expanding mean'; }
+        return feature + ' ' + stat.replace('_', ' ') + ' (' + size + ' seasons)';
+    }
+
+    function prefix(values, from, to) {
+        // out[k] = sum of values[from .. from + k - 1]
+        var out = [0];
+        for (var s = from; s < to; s++) { out.push(out[out.length - 1] + values[s]); }
+        return out;
+    }
+
+    function windowStats(agg, f, g, range, stat, size) {
+        // Mirrors SeasonCube.window_stats: each window is the difference of
+        // two prefix entries, so a series costs O(seasons). Medians are taken
+        // over the window's values, which are contiguous in f.values.
+        var n = range[1] - range[0];
+        var counts = prefix(agg.count[g], range[0], range[1]);
+        var sums = prefix(f.sum[g], range[0], range[1]);
+        var squares = prefix(f.sumsq[g], range[0], range[1]);
+        var offset = g * agg.seasons.length + range[0];
+        var y = [];
+        for (var k = 1; k <= n; k++) {
+            var begin = stat === 'mean' ? k - 1 : stat === 'expanding_mean' ? 0 : Math.max(k - size, 0);
+            var count = counts[k] - counts[begin];
+            var sum = sums[k] - sums[begin];
+            if (stat === 'rolling_std') {
+                var variance = (squares[k] - squares[begin] - sum * sum / count) / (count - 1);
+                y.push(count > 1 ? Math.sqrt(Math.max(variance, 0)) : null);
+            } else if (stat === 'rolling_median') {
+                var values = f.values.slice(agg.cell_bounds[offset + begin], agg.cell_bounds[offset + k]);
+                y.push(count > 0 ? median(values) : null);
+            } else {
+                y.push(count > 0 ? sum / count : null);
+            }
+        }
+        return y;
+    }
+
+    function median(values) {
+        // f.values is sorted within each (group, season) cell only
+        values.sort(function(a, b) { return a - b; });
+        var mid = values.length >> 1;
+        return values.length % 2 ? values[mid] : (values[mid - 1] + values[mid]) / 2;
+    }
+
+    function timeFigure(agg, chooseGroup, feature, lo, hi, stat, size) {
+        var fig = baseFigure(agg, statTitle(feature, stat, size) + ' from ' + lo + '~' + hi);
+        var f = agg.features[feature];
+        var range = seasonSlice(agg, lo, hi);
+        var years = agg.seasons.slice(range[0], range[1]);
+        var groups = selectedGroups(chooseGroup);
+        groups.forEach(function(g) {
+            var y = windowStats(agg, f, g, range, stat, size);
+            fig.data.push({
+                type: 'scatter',
+                x: years,
+                y: y,
+                marker: {color: GROUP_COLORS[g]},
+                name: GROUP_NAMES[g]
+            });
+        });
+        return fig;
+    }
+
+    function clubFirstSeason(agg, lo) {
+        return Math.max(agg.club_first_season, lo);
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        charts: {
+            table_bar: function(chooseGroup, seasonSlider, feature, agg) {
+                return barFigure(agg, chooseGroup, feature, seasonSlider[0], seasonSlider[1]);
+            },
+            table_timeseries: function(chooseGroup, seasonSlider, feature, stat, size, agg) {
+                return timeFigure(agg, chooseGroup, feature, seasonSlider[0], seasonSlider[1], stat, size);
+            },
+            club_bar: function(chooseGroup, seasonSlider, feature, agg) {
+                return barFigure(agg, chooseGroup, feature, clubFirstSeason(agg, seasonSlider[0]), seasonSlider[1]);
+            },
+            club_timeseries: function(chooseGroup, seasonSlider, feature, stat, size, agg) {
+                return timeFigure(agg, chooseGroup, feature, clubFirstSeason(agg, seasonSlider[0]), seasonSlider[1],
+                                  stat, size);
+            }
+        }
+    });
+})();
@@ -0,0 +1,269 @@
+import argparse
+import inspect
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+
+import numpy as np
+from plotly.utils import PlotlyJSONEncoder
+
+import app
+
+# Benchmarks for the dashboard callbacks.
+#   python bench.py callbacks [--baseline bench_baseline.json] [--save-baseline]
+#   python bench.py load [--url http://127.0.0.1:8050] [--users 8] [--requests 400]
+BASELINE_PATH = 'bench_baseline.json'
+
+# A run is flagged as a regression when p50 or p95 grows past this ratio
+REGRESSION_RATIO = 1.25
+
+GROUP_CHOICES = [[1, 0], [1], [0]]
+
+CLUB_CHOICES = [['Arsenal'], ['Liverpool', 'Manchester City'], ['Arsenal', 'Chelsea', 'Liverpool', 'Tottenham']]
+
+
+def season_ranges():
+    first, last = app.league_state(app.DEFAULT_LEAGUE).season_range()
+    return {
+        'full': [first, last],
+        'narrow': [last - 2, last],
+        'middle': [first + (last - first) // 3, first + 2 * (last - first) // 3]
+    }
+
+
+def callback_grid():
+    # (callback name, function, args) for every realistic input combination
+    # of the default league
+    league = app.DEFAULT_LEAGUE
+    grid = []
+    for choose_group in GROUP_CHOICES:
+        for season_slider in season_ranges().values():
+            for feature in app.TABLE_FEATURES:
+                grid.append(('table_barplot', app.table_barplot, (league, choose_group, season_slider, feature)))
+                grid.append(('table_timeSplot', app.table_timeSplot, (league, choose_group, season_slider, feature)))
+                grid.append(('table_timeSplot', app.table_timeSplot,
+                             (league, choose_group, season_slider, feature, 'rolling_median', 4)))
+            for feature in app.CLUB_FEATURES:
+                grid.append(('club_barplot', app.club_barplot, (league, choose_group, season_slider, feature)))
+                grid.append(('club_timeSplot', app.club_timeSplot, (league, choose_group, season_slider, feature)))
+                grid.append(('club_timeSplot', app.club_timeSplot,
+                             (league, choose_group, season_slider, feature, 'rolling_std', 4)))
+            for clubs in CLUB_CHOICES:
+                for feature in ['points', 'pass_accuracy']:
+                    grid.append(('club_compare', app.club_compare, (league, clubs, season_slider, feature)))
+            grid.append(('correlation_heatmap', app.correlation_heatmap, (league, choose_group, season_slider)))
+            grid.append(('separability_ranking', app.separability_ranking, (league, season_slider)))
+            grid.append(('top4_probabilities', app.top4_probabilities, (league, season_slider)))
+            for tab in ['tab_1', 'tab_2']:
+                for page_current in [0, 5]:
+                    grid.append(('show_table', app.show_table,
+                                 (league, tab, season_slider, choose_group, page_current, app.PAGE_SIZE, [], '')))
+    return grid
+
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1000
+    return {
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'p99_ms': float(np.percentile(samples, 99)),
+        'max_ms': float(samples.max())
+    }
+
+
+def bench_callbacks(repeat=5, cached=False):
+    # Calls the callbacks directly; by default the figure cache is bypassed
+    # so the numbers reflect the compute and figure-building cost
+    timings = {}
+    sizes = {}
+    peaks = {}
+    for name, func, args in callback_grid():
+        # unwrap() goes past the panel timer and the figure cache
+        target = func if cached else inspect.unwrap(func)
+        tracemalloc.start()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            value = target(*args)
+            timings.setdefault(name, []).append(time.perf_counter() - start)
+        peaks[name] = max(peaks.get(name, 0), tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        if hasattr(value, 'to_dict'):
+            value = value.to_dict()
+        sizes.setdefault(name, []).append(len(json.dumps(value, cls=PlotlyJSONEncoder)))
+
+    results = {}
+    for name in timings:
+        results[name] = percentiles(timings[name])
+        results[name]['calls'] = len(timings[name])
+        results[name]['json_bytes_mean'] = int(np.mean(sizes[name]))
+        results[name]['json_bytes_max'] = int(np.max(sizes[name]))
+        results[name]['peak_memory_kb'] = int(peaks[name] / 1024)
+    return results
+
+
+def compare(results, baseline, ratio=REGRESSION_RATIO):
+    regressions = []
+    for name, stats in results.items():
+        if name not in baseline:
+            continue
+        for key in ['p50_ms', 'p95_ms', 'json_bytes_max']:
+            if baseline[name][key] > 0 and stats[key] > baseline[name][key] * ratio:
+                regressions.append('%s %s: %.2f -> %.2f' % (name, key, baseline[name][key], stats[key]))
+    return regressions
+
+
+def print_results(results):
+    print('%-20s %6s %9s %9s %9s %11s %11s' % (
+        'callback', 'calls', 'p50 ms', 'p95 ms', 'p99 ms', 'json bytes', 'peak kb'))
+    for name, stats in sorted(results.items()):
+        print('%-20s %6d %9.2f %9.2f %9.2f %11d %11d' % (
+            name, stats['calls'], stats['p50_ms'], stats['p95_ms'], stats['p99_ms'],
+            stats['json_bytes_max'], stats['peak_memory_kb']))
+
+
+# HTTP load test
+def dash_body(outputs, inputs, changed, state=()):
+    # Request body for /_dash-update-component; single-output callbacks are
+    # addressed without the multi-output '..' wrapping
+    if len(outputs) == 1:
+        output = '%s.%s' % outputs[0]
+        outputs_spec = {'id': outputs[0][0], 'property': outputs[0][1]}
+    else:
+        output = '..' + '...'.join('%s.%s' % output for output in outputs) + '..'
+        outputs_spec = [{'id': i, 'property': p} for i, p in outputs]
+    return json.dumps({
+        'output': output,
+        'outputs': outputs_spec,
+        'inputs': [{'id': i, 'property': p, 'value': v} for i, p, v in inputs],
+        'state': [{'id': i, 'property': p, 'value': v} for i, p, v in state],
+        'changedPropIds': [changed]
+    }).encode()
+
+
+def update_requests():
+    # Slider, group, dropdown and table interactions over the input grid,
+    # shaped like the requests the browser sends in the configured mode
+    table_outputs = [('table_table', 'data'), ('table_table', 'columns'), ('table_table', 'page_current'),
+                     ('table_table', 'page_count'), ('table_total', 'children')]
+    chart_outputs = [(chart_id, 'figure') for chart_id, _ in app.CHART_OUTPUTS]
+    compare_outputs = [('club_compare', 'figure')]
+    analytics_outputs = [('correlation_heatmap', 'figure'), ('separability_bar', 'figure')]
+    forecast_outputs = [('forecast_bar', 'figure')]
+    state = [('league_dropdown', 'value', app.DEFAULT_LEAGUE)]
+    bodies = []
+    for choose_group in GROUP_CHOICES:
+        for season_slider in season_ranges().values():
+            for i, club_feature in enumerate(app.CLUB_FEATURES):
+                table_feature = app.TABLE_FEATURES[i % len(app.TABLE_FEATURES)]
+                tab = ['tab_1', 'tab_2'][i % 2]
+                clubs = CLUB_CHOICES[i % len(CLUB_CHOICES)]
+                changed = ['season_slider.value', 'choose_group.value', 'club_dropdown.value',
+                           'table_table.page_current', 'club_select.value'][i % 5]
+                compare_inputs = [('club_select', 'value', clubs), ('compare_dropdown', 'value', 'points')]
+                table_inputs = [
+                    ('table_table', 'page_current', i % 3), ('table_table', 'page_size', app.PAGE_SIZE),
+                    ('table_table', 'sort_by', []), ('table_table', 'filter_query', '')
+                ]
+                if app.CLIENTSIDE_CHARTS:
+                    inputs = [('table_tabs', 'value', tab), ('season_slider', 'value', season_slider),
+                              ('choose_group', 'value', choose_group)] + table_inputs
+                    if changed in ('season_slider.value', 'choose_group.value') and i % 2:
+                        inputs = [('choose_group', 'value', choose_group), ('season_slider', 'value', season_slider)]
+                        bodies.append(('update_analytics', dash_body(analytics_outputs, inputs, changed, state)))
+                    elif changed == 'club_select.value':
+                        inputs = [('season_slider', 'value', season_slider)] + compare_inputs
+                        bodies.append(('club_compare', dash_body(compare_outputs, inputs, changed, state)))
+                    else:
+                        bodies.append(('show_table', dash_body(table_outputs, inputs, changed, state)))
+                else:
+                    inputs = [('choose_group', 'value', choose_group), ('season_slider', 'value', season_slider),
+                              ('table_dropdown', 'value', table_feature), ('club_dropdown', 'value', club_feature),
+                              ('window_stat', 'value', app.WINDOW_STATS[i % len(app.WINDOW_STATS)]),
+                              ('window_size', 'value', 3)] + compare_inputs + [('table_tabs', 'value', tab)] + table_inputs
+                    bodies.append(('update_dashboard', dash_body(
+                        chart_outputs + table_outputs + compare_outputs + analytics_outputs + forecast_outputs, inputs, changed,
+                        state)))
+    return bodies
+
+
+def start_server(port=0):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args):
+            pass
+
+    http_server = make_server('127.0.0.1', port, app.server, threaded=True, request_handler=QuietHandler)
+    thread = threading.Thread(target=http_server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return 'http://127.0.0.1:%d' % http_server.server_port
+
+
+def load_test(url=None, users=8, requests=400):
+    url = url or start_server()
+    bodies = update_requests()
+
+    def send(i):
+        name, body = bodies[i % len(bodies)]
+        request = Request(url + '/_dash-update-component', data=body,
+                          headers={'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        with urlopen(request) as response:
+            size = len(response.read())
+            status = response.status
+        return name, time.perf_counter() - start, size, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        responses = list(pool.map(send, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    results = {}
+    for name in set(r[0] for r in responses):
+        samples = [r for r in responses if r[0] == name]
+        results[name] = percentiles([r[1] for r in samples])
+        results[name]['calls'] = len(samples)
+        results[name]['json_bytes_max'] = max(r[2] for r in samples)
+        results[name]['peak_memory_kb'] = 0
+    errors = sum(1 for r in responses if r[3] != 200)
+    return results, requests / elapsed, errors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the dashboard callbacks.')
+    parser.add_argument('mode', nargs='?', default='callbacks', choices=['callbacks', 'load'])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--cached', action='store_true', help='go through the figure cache')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--url', help='dashboard to load-test; default starts app.server locally')
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=400)
+    args = parser.parse_args()
+
+    if args.mode == 'load':
+        results, throughput, errors = load_test(args.url, args.users, args.requests)
+        print_results(results)
+        print('%.1f requests/s with %d users, %d errors' % (throughput, args.users, errors))
+        sys.exit(1 if errors else 0)
+
+    results = bench_callbacks(args.repeat, args.cached)
+    print_results(results)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    else:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except IOError:
+            baseline = {}
+        regressions = compare(results, baseline)
+        for line in regressions:
+            print('REGRESSION ' + line)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,167 @@
+import functools
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+from plotly.utils import PlotlyJSONEncoder
+
+from dataset import atomic_write
+
+# Two-tier cache for callback figures.
+# The first tier is a bounded LRU dict inside each worker. The optional second
+# tier is a directory of JSON files shared by every gunicorn worker on the
+# host, so a figure rendered by one worker is reused by the others. Its
+# files live in one subdirectory per namespace (the dataset version); a
+# worker switching namespace after an ingest deletes the other ones, so the
+# directory holds the figures of one dataset version only. Within a namespace
+# the oldest files are evicted beyond FIGURE_CACHE_SHARED_FILES; every worker
+# checks the count once per SHARED_PRUNE_INTERVAL of its own writes.
+FIGURE_CACHE_SIZE = int(os.environ.get('FIGURE_CACHE_SIZE', 512))
+FIGURE_CACHE_DIR = os.environ.get('FIGURE_CACHE_DIR')
+FIGURE_CACHE_SHARED_FILES = int(os.environ.get('FIGURE_CACHE_SHARED_FILES', 4096))
+SHARED_PRUNE_INTERVAL = 64
+
+
+class FigureCache(object):
+    def __init__(self, maxsize=FIGURE_CACHE_SIZE, shared_dir=FIGURE_CACHE_DIR, namespace='',
+                 shared_max_files=FIGURE_CACHE_SHARED_FILES):
+        self.maxsize = maxsize
+        self.shared_dir = shared_dir
+        self.shared_max_files = shared_max_files
+        self._shared_writes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.set_namespace(namespace)
+
+    def set_namespace(self, namespace):
+        # Entries of another namespace are never read again
+        self.clear()
+        self.namespace = namespace
+        if self.shared_dir:
+            self._make_shared_dir()
+            for name in os.listdir(self.shared_dir):
+                path = os.path.join(self.shared_dir, name)
+                if path != self._namespace_dir() and os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+
+    def make_key(self, name, args):
+        return json.dumps([self.namespace, name, args], sort_keys=True)
+
+    def _namespace_dir(self):
+        return os.path.join(self.shared_dir, hashlib.sha1(str(self.namespace).encode()).hexdigest()[:16])
+
+    def _make_shared_dir(self):
+        # Other workers may be creating it at the same time
+        os.makedirs(self._namespace_dir(), exist_ok=True)
+
+    def _shared_path(self, key):
+        return os.path.join(self._namespace_dir(), hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        if self.shared_dir:
+            try:
+                with open(self._shared_path(key)) as f:
+                    value = json.load(f)
+            except (OSError, ValueError):
+                # Missing, being replaced or unreadable: a miss
+                pass
+            else:
+                self._remember(key, value)
+                with self._lock:
+                    self.shared_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        self._remember(key, value)
+        if self.shared_dir:
+            # The shared tier is best effort: a failed write (full disk, or
+            # the directory removed by a worker that switched namespace) only
+            # leaves the figure cached in this worker
+            try:
+                self._make_shared_dir()
+                with atomic_write(self._shared_path(key), 'w') as f:
+                    json.dump(value, f, cls=PlotlyJSONEncoder)
+                with self._lock:
+                    self._shared_writes += 1
+                    prune = self._shared_writes % SHARED_PRUNE_INTERVAL == 0
+                if prune:
+                    self._prune_shared()
+            except OSError:
+                pass
+
+    def _prune_shared(self):
+        # Remove the oldest files beyond shared_max_files. Other workers may
+        # be pruning at the same time, so files can vanish under us.
+        directory = self._namespace_dir()
+        files = []
+        for name in os.listdir(directory):
+            if name.endswith('.json'):
+                try:
+                    files.append((os.stat(os.path.join(directory, name)).st_mtime, name))
+                except OSError:
+                    pass
+        files.sort()
+        for _, name in files[:max(len(files) - self.shared_max_files, 0)]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def items(self):
+        # Worker-local entries, least recently used first
+        with self._lock:
+            return list(self._entries.items())
+
+    def update(self, items):
+        for key, value in items:
+            self._remember(key, value)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses
+            }
+
+    def memoize(self, func):
+        # Cache a figure callback on its (JSON-serializable) inputs.
+        # Figures are stored as plain dicts, which Dash serializes directly.
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = self.make_key(func.__name__, args)
+            value = self.get(key)
+            if value is None:
+                value = func(*args)
+                if hasattr(value, 'to_dict'):
+                    value = value.to_dict()
+                self.set(key, value)
+            return value
+        return wrapper
@@ -0,0 +1,100 @@
+import functools
+import threading
+import uuid
+from collections import OrderedDict
+
+import flask
+from dash.exceptions import PreventUpdate
+
+# Drops callback requests that a newer request from the same browser session
+# has superseded, e.g. intermediate positions of a dragged slider. Each Dash
+# update request gets a sequence number per (session, output); callbacks call
+# check() between steps and stop with PreventUpdate once a newer request for
+# the same output has arrived. Tracking is per worker process, so it applies
+# to requests that land on the same threaded worker.
+#
+# A callback may only redraw the outputs whose inputs changed, so a dropped
+# request's changes must not be lost: every request also takes over the
+# changed inputs of the older requests for its key that are still in flight
+# (changed_props()), and recomputes at least what they would have.
+SESSION_COOKIE = 'epl_session'
+MAX_SESSIONS = 10000
+
+
+class SupersededRequests(object):
+    def __init__(self, max_entries=MAX_SESSIONS):
+        self.max_entries = max_entries
+        self._latest = OrderedDict()
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def begin(self, key, changed=()):
+        # (token, changed prop ids of this request and of the older pending
+        # requests it may supersede)
+        with self._lock:
+            entry = self._latest.pop(key, None) or {'token': 0, 'pending': {}}
+            entry['token'] += 1
+            changed = set(changed).union(*entry['pending'].values())
+            entry['pending'][entry['token']] = changed
+            self._latest[key] = entry
+            while len(self._latest) > self.max_entries:
+                self._latest.popitem(last=False)
+            return entry['token'], changed
+
+    def end(self, key, token):
+        with self._lock:
+            entry = self._latest.get(key)
+            if entry is not None:
+                entry['pending'].pop(token, None)
+
+    def is_current(self, key, token):
+        with self._lock:
+            entry = self._latest.get(key)
+            return entry is None or entry['token'] == token
+
+    def changed_props(self):
+        # 'id.property' the current request has to treat as changed, its own
+        # and those inherited from pending requests it may have superseded
+        if not flask.has_request_context() or 'superseded_changed' not in flask.g:
+            return set()
+        return set(flask.g.superseded_changed)
+
+    def check(self):
+        # Raise PreventUpdate if the current request has been superseded
+        if not flask.has_request_context() or 'superseded_key' not in flask.g:
+            return
+        if not self.is_current(flask.g.superseded_key, flask.g.superseded_token):
+            with self._lock:
+                self.dropped += 1
+            raise PreventUpdate
+
+    def cancellable(self, func):
+        # Skip the callback entirely if it was superseded while queued
+        @functools.wraps(func)
+        def wrapper(*args):
+            self.check()
+            return func(*args)
+        return wrapper
+
+    def init_app(self, server):
+        @server.before_request
+        def track_update_request():
+            if flask.request.path.endswith('/_dash-update-component'):
+                session = flask.request.cookies.get(SESSION_COOKIE)
+                body = flask.request.get_json(silent=True) or {}
+                if session and 'output' in body:
+                    key = (session, body['output'])
+                    flask.g.superseded_key = key
+                    flask.g.superseded_token, flask.g.superseded_changed = self.begin(
+                        key, body.get('changedPropIds') or [])
+
+        @server.teardown_request
+        def finish_update_request(exc):
+            if 'superseded_key' in flask.g:
+                self.end(flask.g.superseded_key, flask.g.superseded_token)
+
+        @server.after_request
+        def set_session_cookie(response):
+            if SESSION_COOKIE not in flask.request.cookies:
+                response.set_cookie(SESSION_COOKIE, uuid.uuid4().hex, httponly=True, samesite='Lax')
+            return response
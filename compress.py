@@ -0,0 +1,76 @@
+import gzip
+import re
+
+import flask
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Response compression for app.server, without extra dependencies.
+# Brotli is used when the 'brotli' package is installed and the client
+# accepts it, gzip otherwise.
+COMPRESS_MIMETYPES = [
+    'application/json', 'application/javascript', 'text/html', 'text/css', 'text/plain'
+]
+COMPRESS_MIN_SIZE = 500
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# A compressed body is a different representation, so its strong ETag gets
+# the encoding as a suffix ("abc" -> "abc-gzip"). The suffix is stripped from
+# If-None-Match before a request is handled, so views compare it with their
+# own tags, and put back on the 304.
+ETAG_ENCODING = re.compile(r'-(gzip|br)"')
+
+
+def encode_etag(response, encoding):
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag('%s-%s' % (etag, encoding), weak)
+
+
+def restore_etag_encoding(response):
+    etag, weak = response.get_etag()
+    header = flask.g.get('if_none_match', '')
+    for encoding in ('gzip', 'br'):
+        if etag and '"%s-%s"' % (etag, encoding) in header:
+            response.set_etag('%s-%s' % (etag, encoding), weak)
+            return
+
+
+def init_app(server):
+    @server.before_request
+    def strip_etag_encoding():
+        header = flask.request.environ.get('HTTP_IF_NONE_MATCH')
+        if header and ETAG_ENCODING.search(header):
+            flask.g.if_none_match = header
+            flask.request.environ['HTTP_IF_NONE_MATCH'] = ETAG_ENCODING.sub('"', header)
+
+    @server.after_request
+    def compress_response(response):
+        if response.status_code == 304:
+            restore_etag_encoding(response)
+            return response
+        accept = flask.request.headers.get('Accept-Encoding', '')
+        if (response.direct_passthrough
+                or response.status_code < 200 or response.status_code >= 300
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESS_MIMETYPES):
+            return response
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        if brotli is not None and 'br' in accept:
+            response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+            encoding = 'br'
+        elif 'gzip' in accept:
+            response.set_data(gzip.compress(data, GZIP_LEVEL))
+            encoding = 'gzip'
+        else:
+            return response
+        response.headers['Content-Encoding'] = encoding
+        encode_etag(response, encoding)
+        response.vary.add('Accept-Encoding')
+        return response
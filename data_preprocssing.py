@@ -1,63 +1,157 @@
+import argparse
+import time
+from contextlib import contextmanager
+
 import pandas as pd
 import numpy as np
 
-# Data Preprocessing
-clubstats = pd.read_csv('clubstats.csv')
-tables = pd.read_csv('tables.csv')
-
-# Change to proper data types
-clubstats['cross_accuracy'] = clubstats['cross_accuracy'].map(lambda x: x.rstrip('%')).astype('int')
-clubstats['pass_accuracy'] = clubstats['pass_accuracy'].map(lambda x: x.rstrip('%')).astype('int')
-clubstats['shooting_accuracy'] = clubstats['shooting_accuracy'].map(lambda x: x.rstrip('%')).astype('int')
-clubstats['tackle_success'] = clubstats['tackle_success'].map(lambda x: x.rstrip('%')).astype('int')
-clubstats['aerial_battles'] = clubstats['aerial_battles'].str.replace(',','').astype('int')
-clubstats['clearance'] = clubstats['clearance'].str.replace(',','').astype('int')
-clubstats['cross'] = clubstats['cross'].str.replace(',','').astype('int')
-
-# In 'clubstats' AFC Bournemouth is named as it is, but in 'tables' it is named as 'Bournemouth'.
-# So in order to join the two data frames, the club_name for AFC Bournmouth has to be changed.
-clubstats['club_name'].iloc[53] = 'Bournemouth'
-clubstats['club_name'].iloc[54] = 'Bournemouth'
-clubstats['club_name'].iloc[55] = 'Bournemouth'
-clubstats['club_name'].iloc[56] = 'Bournemouth'
-clubstats['club_name'].iloc[57] = 'Bournemouth'
-
-season_info = clubstats[clubstats['club_name'] == "Arsenal"].loc[:,'season']
-seasons = []
-
-for i in range(len(season_info)):
-    if i < 25:
-        seasons.append([season_info[i],] * 20)
+from dataset import COLUMNS, season_key
+from matches import MATCH_CHUNKSIZE, load_matches
+from store import DEFAULT_LEAGUE, STORE_PATH, PartitionStore, read_catalog, write_league
+
+# Club names that differ between the clubstats and tables sources
+CLUB_ALIASES = {'AFC Bournemouth': 'Bournemouth'}
+
+PERCENT_COLUMNS = ['cross_accuracy', 'pass_accuracy', 'shooting_accuracy', 'tackle_success']
+THOUSANDS_COLUMNS = ['aerial_battles', 'clearance', 'cross']
+
+
+class StageTimer(object):
+    # Wall-clock time spent in each preprocessing stage
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        yield
+        self.stages.append((name, time.perf_counter() - start))
+
+    def report(self):
+        total = sum(seconds for _, seconds in self.stages)
+        lines = ['%-20s %8.1f ms' % (name, seconds * 1000) for name, seconds in self.stages]
+        lines.append('%-20s %8.1f ms' % ('total', total * 1000))
+        return '\n'.join(lines)
+
+
+def read_clubstats(path, chunksize=None):
+    # Cleaning is row-local, so large files can be processed chunk by chunk
+    if chunksize is None:
+        return clean_clubstats(pd.read_csv(path))
+    return pd.concat([clean_clubstats(chunk) for chunk in pd.read_csv(path, chunksize=chunksize)],
+                     ignore_index=True)
+
+
+def assign_table_seasons(tables, clubstats):
+    # 'tables' has no season column: its rows are season blocks in the same
+    # order as the seasons in 'clubstats', and each block has as many rows as
+    # clubs played that season
+    block_sizes = clubstats.groupby('season', sort=False).size()
+    if block_sizes.sum() != len(tables):
+        raise ValueError('tables has %d rows but clubstats has %d club seasons' % (len(tables), block_sizes.sum()))
+    return tables.assign(season=np.repeat(block_sizes.index.values, block_sizes.values))
+
+
+def preprocess(chunksize=None, timer=None, league=DEFAULT_LEAGUE, name=None, root=STORE_PATH):
+    timer = timer or StageTimer()
+    # Data Preprocessing
+    with timer.stage('read + clean'):
+        clubstats = read_clubstats('clubstats.csv', chunksize)
+        tables = pd.read_csv('tables.csv')
+    with timer.stage('assign seasons'):
+        tables = assign_table_seasons(tables, clubstats)
+    # Join two data frames on club and season; club names go through
+    # CLUB_ALIASES (e.g. 'AFC Bournemouth' in clubstats is 'Bournemouth' in tables)
+    with timer.stage('join'):
+        data = join_season_rows(tables, clubstats)
+    # Save preprocessed dataset as the league's season partitions loaded by app.py
+    with timer.stage('write partitions'):
+        write_league(data, league, root, name)
+    return timer
+
+
+def preprocess_matches(path, chunksize=None, timer=None, league=DEFAULT_LEAGUE, name=None, root=STORE_PATH):
+    # Build a league from match-level results instead of the season CSVs
+    timer = timer or StageTimer()
+    with timer.stage('stream matches'):
+        data = load_matches(path, chunksize or MATCH_CHUNKSIZE)
+    with timer.stage('write partitions'):
+        write_league(data, league, root, name)
+    return timer
+
+
+# Change to proper data types ('58%' -> 58, '1,853' -> 1853)
+def clean_clubstats(clubstats):
+    clubstats = clubstats.copy()
+    for col in PERCENT_COLUMNS:
+        clubstats[col] = clubstats[col].astype(str).str.rstrip('%').astype('int')
+    for col in THOUSANDS_COLUMNS:
+        clubstats[col] = clubstats[col].astype(str).str.replace(',', '').astype('int')
+    return clubstats
+
+
+def join_season_rows(tables, clubstats):
+    tables = tables.assign(
+        club_name=tables['club_name'].replace(CLUB_ALIASES),
+        season=season_key(tables['season'])
+    )
+    clubstats = clubstats.assign(
+        club_name=clubstats['club_name'].replace(CLUB_ALIASES),
+        season=season_key(clubstats['season'])
+    )
+    for name, frame in [('tables', tables), ('clubstats', clubstats)]:
+        duplicated = frame.duplicated(['club_name', 'season'])
+        if duplicated.any():
+            raise ValueError('Duplicate club/season rows in %s: %s' % (
+                name, frame.loc[duplicated, ['club_name', 'season']].values.tolist()))
+
+    data = pd.merge(tables, clubstats, on=['club_name', 'season'], how='left', indicator=True)
+    unmatched = data['_merge'] != 'both'
+    if unmatched.any():
+        raise ValueError('No club stats for: %s' % data.loc[unmatched, ['club_name', 'season']].values.tolist())
+    data = data.drop('_merge', axis=1)
+
+    data['total_games'] = data['won'] + data['drawn'] + data['lost']
+    data['is_top4'] = (data['position'] <= 4).astype(int)
+    return data
+
+
+# Incremental ingestion
+# New rows come with an explicit 'season' column in both files, so they are
+# joined on (club_name, season) instead of relying on row positions.
+def ingest(tables_path, clubstats_path, league=DEFAULT_LEAGUE, root=STORE_PATH):
+    # Append rows for club/season pairs the league does not have yet. Only
+    # the partitions of seasons that gained rows are rewritten; running
+    # workers pick the new catalog up through store.CatalogWatcher.
+    if league in read_catalog(root)['leagues']:
+        existing = PartitionStore(root).load(league).frame()
+    else:
+        existing = pd.DataFrame(columns=COLUMNS)
+    new = join_season_rows(pd.read_csv(tables_path), clean_clubstats(pd.read_csv(clubstats_path)))
+    known = pd.MultiIndex.from_arrays([existing['club_name'].values, existing['season'].values])
+    is_known = pd.MultiIndex.from_arrays([new['club_name'].values, new['season'].values]).isin(known)
+    new = new.loc[~is_known, COLUMNS]
+    if len(new):
+        write_league(pd.concat([existing, new], ignore_index=True), league, root)
+    return len(new)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build a league in the partitioned dataset store.')
+    parser.add_argument('--league', default=DEFAULT_LEAGUE, help='league id in the store (default %(default)s)')
+    parser.add_argument('--league-name', help='display name for a new league')
+    parser.add_argument('--store', default=STORE_PATH)
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='read clubstats.csv (or the match file) in chunks of this many rows')
+    parser.add_argument('--matches', metavar='MATCHES_CSV',
+                        help='build the league from match-level results')
+    parser.add_argument('--incremental', nargs=2, metavar=('TABLES_CSV', 'CLUBSTATS_CSV'),
+                        help='append new season rows instead of rebuilding from scratch')
+    args = parser.parse_args()
+    if args.incremental:
+        print('Appended %d rows' % ingest(*args.incremental, league=args.league, root=args.store))
+    elif args.matches:
+        print(preprocess_matches(args.matches, args.chunksize, league=args.league, name=args.league_name,
+                                 root=args.store).report())
     else:
-        seasons.append([season_info[i],] * 22)
-
-seasons_flat = [season for sub_season in seasons for season in sub_season]
-tables['season'] = seasons_flat
-
-# Join two data frames
-data = pd.merge(tables, clubstats, on=['club_name', 'season'])
-
-# To get total number of games
-data['total_games'] = data['won'] + data['drawn'] + data['lost']
-# Add top4 indicator 
-data['is_top4'] = data['position'].apply(lambda x: 1 if (x <= 4) else 0)
-# Change to Datetime
-data['season'] = pd.to_datetime(data['season'],format='%Y/%y')
-
-# numpy datetime and pandas datetime conflict each other
-# create a new dataframe for displaying table
-df = data.copy()
-
-for i in range(len(df)):
-    df['season'].iloc[i] = df['season'].iloc[i].year
-
-# Seperate into two groups
-top4 = data[data['is_top4'] == 1]
-below4  = data[data['is_top4'] == 0]
-
-# Save preprocessed dataset
-clubstats.to_csv('p_clubstats.csv')
-tables.to_csv('p_tables.csv')
-top4.to_csv('top4.csv')
-below4.to_csv('below4.csv')
-df.to_csv('df.csv')
\ No newline at end of file
+        print(preprocess(args.chunksize, league=args.league, name=args.league_name, root=args.store).report())
@@ -0,0 +1,151 @@
+import os
+import tempfile
+
+import numpy as np
+
+# Season-grain rows of one league as typed columns. store.py keeps them as
+# per-season partitions and assembles a Dataset from the partitions a league
+# needs.
+
+# Features offered in the dropdowns
+TABLE_FEATURES = ['drawn', 'goal', 'goal_against', 'lost', 'points', 'won']
+CLUB_FEATURES = [
+    'aerial_battles', 'big_chance_created', 'clearance', 'cross', 'cross_accuracy',
+    'goal_conceded_per_match', 'goal_per_match', 'interceptions', 'pass_accuracy',
+    'pass_per_game', 'shooting_accuracy', 'shot_on_target', 'tackle_success'
+]
+FEATURES = TABLE_FEATURES + CLUB_FEATURES
+
+FLOAT_COLUMNS = ['goal_conceded_per_match', 'goal_per_match', 'pass_per_game']
+COLUMNS = ['club_name', 'season', 'is_top4', 'position', 'total_games'] + FEATURES
+
+
+def column_dtype(name):
+    if name == 'club_name' or name == 'season':
+        return np.int16
+    if name == 'is_top4':
+        return np.int8
+    if name in FLOAT_COLUMNS:
+        return np.float64
+    return np.int32
+
+
+def season_key(values):
+    # Canonical integer season: the year the season ends in.
+    # Accepts integer years, '2019/20' labels, datetimes and '2020-01-01' strings.
+    # pandas is imported here and in frame() only: preprocessing needs it, the
+    # dashboard workers do not.
+    import pandas as pd
+    values = pd.Series(values)
+    if values.dtype.kind in 'iu':
+        return values.values.astype(np.int16)
+    if values.dtype.kind == 'M':
+        return values.dt.year.values.astype(np.int16)
+    values = values.astype(str)
+    start = values.str[:4].astype(int).values
+    return np.where(values.str.contains('/').values, start + 1, start).astype(np.int16)
+
+
+class atomic_write(object):
+    # Write to a temporary file and move it into place on close, so readers
+    # never see a partially written file
+    def __init__(self, path, mode):
+        self.path = path
+        self.mode = mode
+
+    def __enter__(self):
+        # A unique name per write, so threads of one process writing the same
+        # path do not share a temporary file
+        fd, self.tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.',
+                                             prefix=os.path.basename(self.path) + '.', suffix='.tmp')
+        self.file = os.fdopen(fd, self.mode)
+        os.chmod(self.tmp_path, 0o644)
+        return self.file
+
+    def __exit__(self, exc_type, exc, tb):
+        self.file.close()
+        if exc_type is None:
+            os.replace(self.tmp_path, self.path)
+        else:
+            os.remove(self.tmp_path)
+
+
+class SeasonIndex(object):
+    # Row offsets ordered by season (newest first), so a [lo, hi] season
+    # range is a contiguous slice found with searchsorted. Each group has
+    # its own ordering so group filters need no boolean mask either.
+    def __init__(self, seasons, groups):
+        seasons = np.asarray(seasons)
+        groups = np.asarray(groups)
+        order = np.argsort(-seasons, kind='mergesort')
+        self.rows = {None: order}
+        for group in np.unique(groups):
+            self.rows[int(group)] = order[groups[order] == group]
+        # Negated seasons are ascending, as searchsorted requires
+        self.keys = {group: -seasons[rows] for group, rows in self.rows.items()}
+
+    def rows_between(self, lo, hi, group=None):
+        keys = self.keys[group]
+        start = np.searchsorted(keys, -hi, side='left')
+        stop = np.searchsorted(keys, -lo, side='right')
+        return self.rows[group][start:stop]
+
+
+class ClubIndex(object):
+    # Row offsets grouped by club code, each club's rows in season order.
+    # offsets[c]:offsets[c + 1] is club c's slice of order, so a lookup costs
+    # O(club rows). Columns are gathered into the same order on first use,
+    # which makes every club's history a contiguous slice of that array.
+    def __init__(self, columns, n_clubs):
+        self.source = columns
+        codes = np.asarray(columns['club_name'])
+        self.order = np.lexsort((np.asarray(columns['season']), codes))
+        self.offsets = np.zeros(n_clubs + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=n_clubs), out=self.offsets[1:])
+        self._columns = {}
+
+    def span(self, code):
+        return self.offsets[code], self.offsets[code + 1]
+
+    def rows(self, code):
+        start, stop = self.span(code)
+        return self.order[start:stop]
+
+    def column(self, name):
+        if name not in self._columns:
+            self._columns[name] = np.asarray(self.source[name])[self.order]
+        return self._columns[name]
+
+
+class Dataset(object):
+    # Read-only view over the columns of one league
+    def __init__(self, columns, clubs, version=None):
+        self.columns = columns
+        self.clubs = np.array(clubs, dtype=object)
+        self.club_codes = {club: code for code, club in enumerate(clubs)}
+        self.version = version
+        self.season_index = SeasonIndex(columns['season'], columns['is_top4'])
+        self.club_index = ClubIndex(columns, len(clubs))
+
+    def __len__(self):
+        return len(self.columns['season'])
+
+    def __getitem__(self, name):
+        if name == 'club_name':
+            return self.clubs[self.columns['club_name']]
+        return self.columns[name]
+
+    def club_series(self, club, feature, lo=None, hi=None):
+        # (seasons, values) of one club, optionally limited to [lo, hi];
+        # raises KeyError for an unknown club
+        start, stop = self.club_index.span(self.club_codes[club])
+        seasons = self.club_index.column('season')[start:stop]
+        values = self.club_index.column(feature)[start:stop]
+        first = 0 if lo is None else np.searchsorted(seasons, lo, side='left')
+        last = len(seasons) if hi is None else np.searchsorted(seasons, hi, side='right')
+        return seasons[first:last], values[first:last]
+
+    def frame(self, rows=slice(None), columns=COLUMNS):
+        # Materialize only the requested rows and columns
+        import pandas as pd
+        return pd.DataFrame({name: self[name][rows] for name in columns}, columns=columns)
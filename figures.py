@@ -0,0 +1,118 @@
+import copy
+
+import numpy as np
+
+# Figure factory shared by the chart callbacks.
+# Figures are built as plain dicts from one layout template; dcc.Graph takes
+# them as-is and they skip plotly's per-property validation.
+GROUP_NAMES = {1: 'Top 4', 0: 'Below 4'}
+GROUP_COLORS = {1: 'purple', 0: 'navy'}
+
+BASE_LAYOUT = {
+    'plot_bgcolor': 'rgba(0,0,0,0)',
+    'paper_bgcolor': 'rgba(0,0,0,0)',
+    'title': {'text': '', 'y': 0.9, 'x': 0.9, 'font': {'size': 20}},
+    'margin': {'t': 5, 'b': 5},
+    'legend': {'x': -.1, 'y': 1.2},
+    'xaxis': {'showgrid': True, 'gridwidth': 3, 'gridcolor': 'rgb(242,242,242,242)'},
+    'yaxis': {'showgrid': True, 'gridwidth': 3, 'gridcolor': 'rgb(242,242,242,242)'}
+}
+
+# Upper bound on points per line trace
+MAX_POINTS = 500
+
+# Decimals kept for float values sent to the browser
+PRECISION = 4
+
+
+def compact(values):
+    # Shortest JSON form of a numeric array: integers without a decimal
+    # point, floats rounded to PRECISION, NaN as null
+    values = np.asarray(values)
+    if values.dtype.kind in 'iub':
+        return values.tolist()
+    if values.size and np.all(np.isfinite(values)) and np.all(np.mod(values, 1) == 0):
+        return values.astype(np.int64).tolist()
+    rounded = np.round(values.astype(float), PRECISION)
+    return [None if np.isnan(v) else v for v in rounded.tolist()]
+
+
+def downsample(x, y, max_points=MAX_POINTS):
+    # Average consecutive points into at most max_points buckets
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(x) <= max_points:
+        return x, y
+    starts = np.linspace(0, len(x), max_points, endpoint=False).astype(np.int64)
+    sizes = np.diff(np.append(starts, len(x)))
+    valid = ~np.isnan(y)
+    y_sum = np.add.reduceat(np.where(valid, y, 0), starts)
+    y_count = np.add.reduceat(valid.astype(np.int64), starts)
+    with np.errstate(invalid='ignore'):
+        return np.add.reduceat(x, starts) / sizes, np.where(y_count > 0, y_sum / y_count, np.nan)
+
+
+def base_figure(title):
+    layout = copy.deepcopy(BASE_LAYOUT)
+    layout['title']['text'] = title
+    return {'data': [], 'layout': layout}
+
+
+def bar_figure(title, x, counts_by_group, width):
+    # Stacked bars, one trace per group
+    fig = base_figure(title)
+    x = compact(x)
+    for group, counts in counts_by_group:
+        fig['data'].append({
+            'type': 'bar', 'x': x, 'y': compact(counts), 'width': width,
+            'marker': {'color': GROUP_COLORS[group]}, 'name': GROUP_NAMES[group]
+        })
+    fig['layout']['barmode'] = 'stack'
+    return fig
+
+
+def line_figure(title, x, y_by_group):
+    fig = base_figure(title)
+    for group, y in y_by_group:
+        trace_x, trace_y = downsample(x, y)
+        fig['data'].append({
+            'type': 'scatter', 'x': compact(trace_x), 'y': compact(trace_y),
+            'marker': {'color': GROUP_COLORS[group]}, 'name': GROUP_NAMES[group]
+        })
+    return fig
+
+
+def series_figure(title, series):
+    # One line per (name, x, y); used for club comparisons, where each club
+    # has its own seasons
+    fig = base_figure(title)
+    for name, x, y in series:
+        fig['data'].append({
+            'type': 'scatter', 'mode': 'lines+markers', 'x': compact(x), 'y': compact(y), 'name': name
+        })
+    return fig
+
+
+def heatmap_figure(title, labels, matrix):
+    # Correlation matrix, diverging colors fixed to [-1, 1]
+    fig = base_figure(title)
+    fig['data'].append({
+        'type': 'heatmap', 'x': list(labels), 'y': list(labels), 'z': [compact(row) for row in matrix],
+        'zmin': -1, 'zmax': 1, 'colorscale': 'RdBu', 'reversescale': True
+    })
+    fig['layout']['yaxis'] = dict(fig['layout']['yaxis'], autorange='reversed')
+    return fig
+
+
+def ranking_figure(title, labels, values, groups=None):
+    # Horizontal bars, largest first; colored by the given group per bar or
+    # else by the group a positive or negative value favours
+    fig = base_figure(title)
+    if groups is None:
+        groups = [1 if v >= 0 else 0 for v in np.nan_to_num(values)]
+    fig['data'].append({
+        'type': 'bar', 'orientation': 'h', 'x': compact(values), 'y': list(labels),
+        'marker': {'color': [GROUP_COLORS[group] for group in groups]}
+    })
+    fig['layout']['yaxis'] = dict(fig['layout']['yaxis'], autorange='reversed')
+    return fig
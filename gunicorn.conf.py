@@ -0,0 +1,56 @@
+import gc
+import multiprocessing
+import os
+
+# Production serving profile, used by the Procfile:
+#   gunicorn app:server --config gunicorn.conf.py
+# The app is imported once in the master (preload_app) so the loaded league,
+# its season cube and the warmed figure cache are shared with the forked
+# workers copy-on-write instead of being rebuilt per worker.
+#
+# FAST_START=1 restores that state from the startup snapshot (snapshot.py;
+# python app.py snapshot in the build step) instead of building it, which
+# matters most without preload, where every worker boots on its own. Each
+# boot logs its startup profile (startup.py).
+bind = '0.0.0.0:%s' % os.environ.get('PORT', '8000')
+
+# WEB_CONCURRENCY processes, each serving GUNICORN_THREADS requests at once.
+# The callbacks spend most of their time in numpy and JSON encoding, so a few
+# threads per worker keep the cores busy while requests wait on I/O.
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread' if threads > 1 else 'sync')
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = 5
+
+# Recycle workers now and then; with preload the replacement starts from the
+# master's warm state
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+
+def when_ready(server):
+    # Master only, after the preloaded app is imported and before the first
+    # fork: render the common figures once for every worker
+    if preload_app:
+        import app
+        stats = app.warm_cache()
+        server.log.info('figure cache warm: %s', stats)
+        server.log.info('startup profile (%s):\n%s',
+                        'snapshot' if app.startup_snapshot is not None else 'cold', app.startup.report())
+        # Keep the warmed objects out of the collector so it does not touch
+        # (and copy) their pages in the workers
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    # Without preload every worker imports the app itself and warms its own
+    # cache before it reports ready
+    import app
+    if not app.ready.is_set():
+        app.warm_cache()
+        worker.log.info('startup profile (%s):\n%s',
+                        'snapshot' if app.startup_snapshot is not None else 'cold', app.startup.report())
@@ -0,0 +1,52 @@
+import numpy as np
+
+# Upper bound on bars per histogram trace
+MAX_BINS = 50
+
+
+def nice_width(span, max_bins=MAX_BINS):
+    # Smallest 1/2/5 x 10^k width that covers span in at most max_bins bins
+    raw = span / float(max_bins)
+    if raw <= 0:
+        return 1.0
+    exponent = np.floor(np.log10(raw))
+    for step in (1, 2, 5, 10):
+        width = step * 10 ** exponent
+        if width >= raw:
+            return float(width)
+
+
+class Binning(object):
+    # Fixed-width bins over the observed range of a feature.
+    # Integer features whose range fits in max_bins get one bin per value;
+    # everything else gets a rounded width so the bar count stays bounded.
+    def __init__(self, values, width=None, max_bins=MAX_BINS):
+        values = np.asarray(values, dtype=float)
+        lo, hi = values.min(), values.max()
+        integer = np.all(np.mod(values, 1) == 0)
+        if width is None:
+            if integer and hi - lo + 1 <= max_bins:
+                width = 1.0
+            else:
+                width = nice_width(hi - lo, max_bins)
+        self.width = float(width)
+        self.integer = bool(integer)
+        self.start = np.floor(lo / self.width) * self.width
+        self.n_bins = int(np.floor((hi - self.start) / self.width)) + 1
+
+    def index(self, values):
+        idx = np.floor((np.asarray(values, dtype=float) - self.start) / self.width).astype(np.int64)
+        return np.clip(idx, 0, self.n_bins - 1)
+
+    def centers(self):
+        left = self.start + self.width * np.arange(self.n_bins)
+        if self.integer and self.width == 1:
+            return left
+        return left + self.width / 2
+
+
+def season_histograms(g_idx, s_idx, values, binning, n_seasons):
+    # Counts per (group, season, bin) in one scatter-add over all rows
+    hist = np.zeros((2, n_seasons, binning.n_bins), dtype=np.int64)
+    np.add.at(hist, (g_idx, s_idx, binning.index(values)), 1)
+    return hist
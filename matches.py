@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+from dataset import COLUMNS, FEATURES, season_key
+
+# Streaming loader for match-level results. Large match files are read in
+# chunks and folded into per-(club, season) totals as they go, so memory is
+# bounded by the number of club seasons rather than the number of matches.
+#
+# One row per match with at least home_team, away_team, home_goals,
+# away_goals and either a season or a date column. football-data.co.uk
+# headers (HomeTeam, FTHG, ...) are accepted as well. Club statistics are
+# picked up from home_<feature>/away_<feature> columns when present and left
+# at zero otherwise, as for seasons before club stats were recorded.
+MATCH_CHUNKSIZE = 100000
+
+MATCH_ALIASES = {
+    'Season': 'season', 'Date': 'date', 'HomeTeam': 'home_team', 'AwayTeam': 'away_team',
+    'FTHG': 'home_goals', 'FTAG': 'away_goals'
+}
+
+# Club stats that are season totals and those that are per-match averages;
+# goal_per_match and goal_conceded_per_match come from the scores
+SUM_STATS = ['aerial_battles', 'big_chance_created', 'clearance', 'cross', 'interceptions', 'shot_on_target']
+MEAN_STATS = ['cross_accuracy', 'pass_accuracy', 'pass_per_game', 'shooting_accuracy', 'tackle_success']
+
+# Leagues start in August; a match played from July onwards belongs to the
+# season that ends the following year
+SEASON_START_MONTH = 7
+
+
+def match_columns(path):
+    # Columns to read and the club stats available in the file
+    header = [MATCH_ALIASES.get(name, name) for name in pd.read_csv(path, nrows=0).columns]
+    missing = [name for name in ['home_team', 'away_team', 'home_goals', 'away_goals'] if name not in header]
+    if missing or ('season' not in header and 'date' not in header):
+        raise ValueError('%s is missing match columns: %s' % (path, missing or ['season or date']))
+    stats = [stat for stat in SUM_STATS + MEAN_STATS
+             if 'home_' + stat in header and 'away_' + stat in header]
+    usecols = ['home_team', 'away_team', 'home_goals', 'away_goals']
+    usecols.append('season' if 'season' in header else 'date')
+    for stat in stats:
+        usecols.extend(['home_' + stat, 'away_' + stat])
+    return usecols, stats
+
+
+def match_seasons(chunk):
+    if 'season' in chunk:
+        return season_key(chunk['season'])
+    # A chunk holds few distinct match days; parse each of them once
+    codes, days = pd.factorize(chunk['date'])
+    days = pd.DatetimeIndex(pd.to_datetime(days, dayfirst=True))
+    seasons = (days.year + (days.month >= SEASON_START_MONTH)).values.astype(np.int16)
+    return seasons[codes]
+
+
+def club_season_totals(chunk, stats):
+    # Each match counts once for the home side and once for the away side
+    seasons = match_seasons(chunk)
+    sides = []
+    for side, other in [('home', 'away'), ('away', 'home')]:
+        goal = chunk[side + '_goals'].values
+        goal_against = chunk[other + '_goals'].values
+        rows = {
+            'club_name': chunk[side + '_team'].values,
+            'season': seasons,
+            'won': (goal > goal_against).astype(np.int64),
+            'drawn': (goal == goal_against).astype(np.int64),
+            'lost': (goal < goal_against).astype(np.int64),
+            'goal': goal.astype(np.int64),
+            'goal_against': goal_against.astype(np.int64)
+        }
+        for stat in stats:
+            values = chunk[side + '_' + stat].astype(float)
+            rows[stat] = values.fillna(0).values
+            rows[stat + '_matches'] = values.notnull().values.astype(np.int64)
+        sides.append(pd.DataFrame(rows))
+    return pd.concat(sides, ignore_index=True).groupby(['club_name', 'season']).sum()
+
+
+def stream_match_totals(path, chunksize=MATCH_CHUNKSIZE):
+    usecols, stats = match_columns(path)
+    totals = None
+    for chunk in pd.read_csv(path, chunksize=chunksize,
+                             usecols=lambda name: MATCH_ALIASES.get(name, name) in usecols):
+        partial = club_season_totals(chunk.rename(columns=MATCH_ALIASES), stats)
+        totals = partial if totals is None else totals.add(partial, fill_value=0)
+    if totals is None:
+        raise ValueError('%s has no matches' % path)
+    return totals, stats
+
+
+def season_rows(totals, stats):
+    # Club/season totals -> the rows store.write_league expects
+    data = totals.reset_index()
+    # Chunk totals are added with fill_value, which makes them floats
+    for column in ['won', 'drawn', 'lost', 'goal', 'goal_against']:
+        data[column] = data[column].astype(np.int64)
+    data['total_games'] = data['won'] + data['drawn'] + data['lost']
+    data['points'] = 3 * data['won'] + data['drawn']
+    # Final position by points, goal difference, then goals scored
+    data['goal_difference'] = data['goal'] - data['goal_against']
+    data = data.sort_values(['season', 'points', 'goal_difference', 'goal', 'club_name'],
+                            ascending=[True, False, False, False, True], kind='mergesort')
+    data['position'] = data.groupby('season').cumcount() + 1
+    data['is_top4'] = (data['position'] <= 4).astype(int)
+
+    games = data['total_games'].values
+    data['goal_per_match'] = np.round(data['goal'] / games, 2)
+    data['goal_conceded_per_match'] = np.round(data['goal_against'] / games, 2)
+    for stat in MEAN_STATS:
+        if stat in stats:
+            matches = data[stat + '_matches'].values
+            with np.errstate(invalid='ignore', divide='ignore'):
+                data[stat] = np.where(matches > 0, data[stat] / matches, 0)
+    for feature in FEATURES:
+        if feature not in data:
+            data[feature] = 0
+    data = data.fillna(0)
+    for stat in stats:
+        data[stat] = np.round(data[stat], 2) if stat == 'pass_per_game' else np.round(data[stat]).astype(int)
+    return data[COLUMNS].reset_index(drop=True)
+
+
+def load_matches(path, chunksize=MATCH_CHUNKSIZE):
+    totals, stats = stream_match_totals(path, chunksize)
+    return season_rows(totals, stats)
@@ -0,0 +1,167 @@
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+import flask
+
+# Per-callback instrumentation, exposed in the Prometheus text format on
+# /metrics. Each gunicorn worker keeps its own counters; scrape every worker
+# or aggregate in Prometheus.
+#   compute   time spent inside the callback (including figure cache lookups)
+#   serialize rest of the request: Dash input parsing and JSON encoding
+#   response  size of the /_dash-update-component response body
+#   panel     time spent in each panel function (figure or table), so the
+#             panels of a fused callback are still timed one by one
+BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
+
+# Distinct input combinations tracked per process; the rest are counted
+# under inputs="other" so label cardinality stays bounded
+MAX_INPUT_SERIES = int(os.environ.get('METRICS_MAX_INPUT_SERIES', 500))
+
+# Set CALLBACK_LOG=1 to also log one JSON line per callback request
+CALLBACK_LOG = os.environ.get('CALLBACK_LOG') == '1'
+
+logger = logging.getLogger('epl.metrics')
+
+
+class Histogram(object):
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ['+Inf'], self.counts):
+            cumulative += count
+            lines.append('%s_bucket{%s,le="%s"} %d' % (name, labels, bound, cumulative))
+        lines.append('%s_sum{%s} %f' % (name, labels, self.sum))
+        lines.append('%s_count{%s} %d' % (name, labels, self.count))
+        return lines
+
+
+class CallbackMetrics(object):
+    def __init__(self, max_input_series=MAX_INPUT_SERIES, log=CALLBACK_LOG):
+        self.max_input_series = max_input_series
+        self.log = log
+        self.collectors = []
+        self._lock = threading.Lock()
+        self.compute = {}
+        self.serialize = {}
+        self.response_bytes = {}
+        self.inputs = {}
+        self.panels = {}
+
+    def instrument(self, func):
+        # Time the callback; the rest is recorded when the response is ready
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            start = time.perf_counter()
+            value = func(*args)
+            elapsed = time.perf_counter() - start
+            key = json.dumps(args, sort_keys=True)
+            if flask.has_request_context():
+                flask.g.callback_metrics = (name, key, elapsed)
+            else:
+                self.record(name, key, elapsed)
+            return value
+        return wrapper
+
+    def panel(self, func):
+        # Time a panel function under its own name, wherever it is called from
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            start = time.perf_counter()
+            value = func(*args)
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                if name not in self.panels:
+                    self.panels[name] = Histogram()
+                self.panels[name].observe(elapsed)
+            return value
+        return wrapper
+
+    def record(self, name, key, compute, serialize=0.0, response_bytes=0):
+        with self._lock:
+            if name not in self.compute:
+                self.compute[name] = Histogram()
+                self.serialize[name] = Histogram()
+                self.response_bytes[name] = [0, 0]
+            self.compute[name].observe(compute)
+            self.serialize[name].observe(serialize)
+            self.response_bytes[name][0] += response_bytes
+            self.response_bytes[name][1] += 1
+            series = (name, key)
+            if series not in self.inputs and len(self.inputs) >= self.max_input_series:
+                series = (name, 'other')
+            calls, seconds = self.inputs.get(series, (0, 0.0))
+            self.inputs[series] = (calls + 1, seconds + compute)
+        if self.log:
+            logger.info(json.dumps({
+                'callback': name, 'inputs': key, 'compute_ms': round(compute * 1000, 3),
+                'serialize_ms': round(serialize * 1000, 3), 'response_bytes': response_bytes
+            }))
+
+    def init_app(self, server):
+        @server.before_request
+        def start_timer():
+            flask.g.request_start = time.perf_counter()
+
+        @server.after_request
+        def record_request(response):
+            recorded = flask.g.pop('callback_metrics', None)
+            if recorded is not None:
+                name, key, compute = recorded
+                total = time.perf_counter() - flask.g.request_start
+                self.record(name, key, compute, max(total - compute, 0.0), response.content_length or 0)
+            return response
+
+        @server.route('/metrics')
+        def metrics():
+            return flask.Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def add_collector(self, collector):
+        # collector() returns {metric name: value} for extra gauges
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            lines.append('# TYPE dash_callback_compute_seconds histogram')
+            for name, hist in sorted(self.compute.items()):
+                lines.extend(hist.render('dash_callback_compute_seconds', 'callback="%s"' % name))
+            lines.append('# TYPE dash_callback_serialize_seconds histogram')
+            for name, hist in sorted(self.serialize.items()):
+                lines.extend(hist.render('dash_callback_serialize_seconds', 'callback="%s"' % name))
+            lines.append('# TYPE dash_panel_compute_seconds histogram')
+            for name, hist in sorted(self.panels.items()):
+                lines.extend(hist.render('dash_panel_compute_seconds', 'panel="%s"' % name))
+            lines.append('# TYPE dash_callback_response_bytes summary')
+            for name, (total, count) in sorted(self.response_bytes.items()):
+                lines.append('dash_callback_response_bytes_sum{callback="%s"} %d' % (name, total))
+                lines.append('dash_callback_response_bytes_count{callback="%s"} %d' % (name, count))
+            lines.append('# TYPE dash_callback_input_calls_total counter')
+            lines.append('# TYPE dash_callback_input_compute_seconds_total counter')
+            for (name, key), (calls, seconds) in sorted(self.inputs.items()):
+                labels = 'callback="%s",inputs="%s"' % (name, key.replace('\\', '\\\\').replace('"', '\\"'))
+                lines.append('dash_callback_input_calls_total{%s} %d' % (labels, calls))
+                lines.append('dash_callback_input_compute_seconds_total{%s} %f' % (labels, seconds))
+        for collector in self.collectors:
+            for metric, value in sorted(collector().items()):
+                lines.append('%s %s' % (metric, value))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,165 @@
+import argparse
+import json
+
+import numpy as np
+
+from dataset import CLUB_FEATURES, atomic_write
+from store import DEFAULT_LEAGUE, STORE_PATH, LRUCache, PartitionStore
+
+# Top 4 finish probability from the table and club stats.
+#   python model.py train [--store store] [--league epl] [--out top4_model.json] [--l2 1.0]
+# Training is offline; the dashboard only loads the serialized coefficients
+# and scores a whole season with one matrix product.
+#
+# Counting features are turned into per-game rates so a club's numbers part
+# way through a season are comparable with full seasons, and every feature is
+# centered on its season mean so the model compares clubs within a season.
+MODEL_PATH = 'top4_model.json'
+
+TABLE_RATES = ['won', 'drawn', 'lost', 'goal', 'goal_against', 'points']
+CLUB_RATES = ['aerial_battles', 'big_chance_created', 'clearance', 'cross', 'interceptions', 'shot_on_target']
+CLUB_LEVELS = [feature for feature in CLUB_FEATURES if feature not in CLUB_RATES]
+MODEL_FEATURES = TABLE_RATES + CLUB_RATES + CLUB_LEVELS
+
+L2 = 1.0
+MAX_ITER = 50
+
+
+def has_club_stats(data, rows):
+    # Rows of seasons before club stats were recorded for every club have
+    # zeros in some of them and cannot be scored
+    return np.all([np.asarray(data[feature][rows]) > 0 for feature in CLUB_FEATURES], axis=0)
+
+
+def design_matrix(data, rows):
+    # Per-game rates and levels, centered on the mean of their season
+    rows = np.asarray(rows)
+    games = np.maximum(np.asarray(data['total_games'][rows], dtype=float), 1)
+    columns = [np.asarray(data[feature][rows], dtype=float) / games for feature in TABLE_RATES + CLUB_RATES]
+    columns += [np.asarray(data[feature][rows], dtype=float) for feature in CLUB_LEVELS]
+    x = np.column_stack(columns)
+    _, season_idx = np.unique(np.asarray(data['season'][rows]), return_inverse=True)
+    counts = np.bincount(season_idx)
+    season_means = np.zeros((len(counts), x.shape[1]))
+    np.add.at(season_means, season_idx, x)
+    return x - (season_means / counts[:, None])[season_idx]
+
+
+def sigmoid(z):
+    return 1 / (1 + np.exp(-np.clip(z, -30, 30)))
+
+
+def fit_logistic(x, y, l2=L2, max_iter=MAX_ITER):
+    # L2-regularized logistic regression by Newton's method on standardized
+    # features; the intercept is not penalized
+    scale = x.std(axis=0)
+    scale[scale == 0] = 1
+    xb = np.column_stack([np.ones(len(x)), x / scale])
+    penalty = np.full(xb.shape[1], float(l2))
+    penalty[0] = 0
+    w = np.zeros(xb.shape[1])
+    for _ in range(max_iter):
+        p = sigmoid(xb.dot(w))
+        grad = xb.T.dot(p - y) + penalty * w
+        hessian = xb.T.dot(xb * (p * (1 - p))[:, None]) + np.diag(penalty)
+        step = np.linalg.solve(hessian, grad)
+        w -= step
+        if np.abs(step).max() < 1e-8:
+            break
+    return {'intercept': float(w[0]), 'coef': (w[1:] / scale).tolist()}
+
+
+def training_rows(data, seasons=None):
+    rows = np.arange(len(data))
+    if seasons is not None:
+        rows = rows[np.isin(np.asarray(data['season']), seasons)]
+    return rows[has_club_stats(data, rows)]
+
+
+def train(data, l2=L2, exclude_latest=True):
+    # Fit on every complete season with club stats. The latest season is
+    # left out by default: it is the one being forecast and its is_top4 is
+    # only the current standing.
+    seasons = np.unique(np.asarray(data['season']))
+    if exclude_latest:
+        seasons = seasons[:-1]
+    rows = training_rows(data, seasons)
+    weights = fit_logistic(design_matrix(data, rows), np.asarray(data['is_top4'][rows], dtype=float), l2)
+    trained_seasons = np.unique(np.asarray(data['season'][rows]))
+    return dict(weights, features=MODEL_FEATURES, l2=l2, dataset_version=data.version,
+                seasons=[int(trained_seasons[0]), int(trained_seasons[-1])], rows=int(len(rows)))
+
+
+def evaluate(data, l2=L2):
+    # Leave one season out: share of actual top 4 clubs among the four with
+    # the highest predicted probability, and the mean log loss
+    seasons = np.unique(np.asarray(data['season'][training_rows(data)]))[:-1]
+    hits = []
+    losses = []
+    for season in seasons:
+        train_rows = training_rows(data, seasons[seasons != season])
+        model = fit_logistic(design_matrix(data, train_rows), np.asarray(data['is_top4'][train_rows], dtype=float), l2)
+        rows = training_rows(data, [season])
+        p = predict(model, data, rows)
+        y = np.asarray(data['is_top4'][rows])
+        hits.append(y[np.argsort(-p)[:4]].mean())
+        losses.append(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p)))
+    return {'seasons': len(seasons), 'top4_hit_rate': float(np.mean(hits)), 'log_loss': float(np.mean(losses))}
+
+
+def predict(model, data, rows):
+    # Probabilities for the given rows in one batch
+    return sigmoid(design_matrix(data, rows).dot(np.asarray(model['coef'])) + model['intercept'])
+
+
+def save_model(model, path=MODEL_PATH):
+    with atomic_write(path, 'w') as f:
+        json.dump(model, f, indent=2)
+
+
+def load_model(path=MODEL_PATH):
+    try:
+        with open(path) as f:
+            model = json.load(f)
+    except IOError:
+        return None
+    if model.get('features') != MODEL_FEATURES:
+        raise ValueError('%s was trained on different features; retrain with python model.py train' % path)
+    return model
+
+
+class Top4Forecast(object):
+    # Season forecasts keyed on (dataset version, season), so every league
+    # shares one bounded cache; a season is scored once, all clubs in one batch
+    def __init__(self, model, maxsize=256):
+        self.model = model
+        self._seasons = LRUCache(None, maxsize)
+
+    def season(self, data, season):
+        # (club names, probabilities) sorted by probability, or None when the
+        # season has no club stats to score
+        def build(key):
+            rows = data.season_index.rows_between(season, season)
+            rows = rows[has_club_stats(data, rows)]
+            if not len(rows):
+                return None
+            p = predict(self.model, data, rows)
+            order = np.argsort(-p, kind='mergesort')
+            return [str(club) for club in data.clubs[data.columns['club_name'][rows[order]]]], p[order]
+        return self._seasons.get((data.version, season), build)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train the Top 4 finish model.')
+    parser.add_argument('command', choices=['train'])
+    parser.add_argument('--store', default=STORE_PATH)
+    parser.add_argument('--league', default=DEFAULT_LEAGUE)
+    parser.add_argument('--out', default=MODEL_PATH)
+    parser.add_argument('--l2', type=float, default=L2)
+    args = parser.parse_args()
+
+    data = PartitionStore(args.store).load(args.league)
+    print(json.dumps(evaluate(data, args.l2)))
+    model = train(data, args.l2)
+    save_model(model, args.out)
+    print('Trained on %d rows (%d-%d), saved to %s' % (model['rows'], model['seasons'][0], model['seasons'][1], args.out))
@@ -0,0 +1,139 @@
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import plotly.io as pio
+from plotly.utils import PlotlyJSONEncoder
+
+import app
+from bench import percentiles
+from dataset import atomic_write
+
+# Offline export of every chart for the weekly reports.
+#   python report.py [--league epl] [--out reports] [--format html] [--workers 4] [--window 2011 2020]
+# Figures come from the dashboard's chart callbacks. An output is only
+# rewritten when the hash of its figure changed since the last run.
+REPORT_DIR = 'reports'
+MANIFEST = 'manifest.json'
+
+CHARTS = [
+    ('table_bar', 'table_barplot', app.TABLE_FEATURES),
+    ('table_timeseries', 'table_timeSplot', app.TABLE_FEATURES),
+    ('club_bar', 'club_barplot', app.CLUB_FEATURES),
+    ('club_timeseries', 'club_timeSplot', app.CLUB_FEATURES)
+]
+
+GROUP_CHOICES = {'all': [1, 0], 'top4': [1], 'below4': [0]}
+
+
+def report_windows(league=app.DEFAULT_LEAGUE, extra=()):
+    first, last = app.league_state(league).season_range()
+    windows = {
+        'full': [first, last],
+        'last10': [max(first, last - 9), last],
+        'last5': [max(first, last - 4), last]
+    }
+    for lo, hi in extra:
+        windows['%d-%d' % (lo, hi)] = [lo, hi]
+    return windows
+
+
+def report_jobs(league, windows, fmt):
+    # (file name, callback name, args) for the full matrix
+    jobs = []
+    for chart_id, callback, features in CHARTS:
+        for feature in features:
+            for group_name, choose_group in GROUP_CHOICES.items():
+                for window_name, season_slider in windows.items():
+                    name = '%s_%s_%s_%s.%s' % (chart_id, feature, group_name, window_name, fmt)
+                    jobs.append((name, callback, (league, choose_group, season_slider, feature)))
+    return jobs
+
+
+def figure_hash(figure, fmt):
+    digest = hashlib.sha1(fmt.encode())
+    digest.update(json.dumps(figure, cls=PlotlyJSONEncoder, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def render(job):
+    # Runs in a pool worker; the app module and the loaded league are
+    # inherited from the parent process
+    name, callback, args, out_dir, fmt, previous = job
+    start = time.perf_counter()
+    figure = inspect.unwrap(getattr(app, callback))(*args)
+    content_hash = figure_hash(figure, fmt)
+    path = os.path.join(out_dir, name)
+    written = content_hash != previous or not os.path.exists(path)
+    if written:
+        if fmt == 'html':
+            with atomic_write(path, 'w') as f:
+                f.write(pio.to_html(figure, include_plotlyjs='cdn', full_html=True))
+        else:
+            # Static images need plotly's image export (orca or kaleido)
+            with atomic_write(path, 'wb') as f:
+                f.write(pio.to_image(figure, format=fmt))
+    return name, callback, content_hash, written, time.perf_counter() - start
+
+
+def write_index(league, out_dir, names):
+    links = '\n'.join('<li><a href="%s">%s</a></li>' % (name, name) for name in sorted(names))
+    with atomic_write(os.path.join(out_dir, 'index.html'), 'w') as f:
+        state = app.league_state(league)
+        f.write('<html><head><title>%s report %s</title></head><body><ul>\n%s\n</ul></body></html>\n' % (
+            state.name, state.version, links))
+
+
+def export(league=app.DEFAULT_LEAGUE, out_dir=REPORT_DIR, fmt='html', workers=None, windows=None):
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except IOError:
+        manifest = {}
+
+    jobs = [(name, callback, args, out_dir, fmt, manifest.get(name))
+            for name, callback, args in report_jobs(league, windows or report_windows(league), fmt)]
+    workers = workers or os.cpu_count()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(render, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+    elapsed = time.perf_counter() - start
+
+    manifest = {name: content_hash for name, _, content_hash, _, _ in results}
+    with atomic_write(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    write_index(league, out_dir, manifest)
+
+    timings = {}
+    for _, callback, _, _, seconds in results:
+        timings.setdefault(callback, []).append(seconds)
+    written = sum(1 for result in results if result[3])
+    return timings, written, len(results) - written, elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render every dashboard chart to files.')
+    parser.add_argument('--league', default=app.DEFAULT_LEAGUE)
+    parser.add_argument('--out', default=None, help='output directory; default %s/<league>' % REPORT_DIR)
+    parser.add_argument('--format', default='html', choices=['html', 'png', 'svg', 'pdf'])
+    parser.add_argument('--workers', type=int, default=None, help='worker processes; default one per core')
+    parser.add_argument('--window', nargs=2, type=int, action='append', default=[], metavar=('FIRST', 'LAST'),
+                        help='extra season window to render, e.g. --window 2011 2020')
+    args = parser.parse_args()
+
+    out_dir = args.out or os.path.join(REPORT_DIR, args.league)
+    timings, written, skipped, elapsed = export(args.league, out_dir, args.format, args.workers,
+                                                report_windows(args.league, args.window))
+    print('%-16s %6s %9s %9s %9s' % ('callback', 'figures', 'p50 ms', 'p95 ms', 'max ms'))
+    for callback, samples in sorted(timings.items()):
+        stats = percentiles(samples)
+        print('%-16s %6d %9.2f %9.2f %9.2f' % (
+            callback, len(samples), stats['p50_ms'], stats['p95_ms'], stats['max_ms']))
+    print('%d written, %d unchanged in %.2f s' % (written, skipped, elapsed))
@@ -0,0 +1,52 @@
+import glob
+import hashlib
+import os
+import pickle
+
+from dataset import atomic_write
+
+# Startup snapshot: one pickle holding what a freshly imported app.py would
+# otherwise build before serving (the default league's dataset and aggregate
+# cube, the layout tree with its serialized JSON and the warmed figures).
+#   python app.py snapshot
+# writes it; with FAST_START=1 workers restore from it, and the first worker
+# to warm its cache writes it when it is missing or stale.
+#
+# The file starts with a key of the catalog version, the source of the app
+# modules and the serving settings. A snapshot whose key does not match is
+# ignored, so a new ingest or deploy falls back to a normal start instead of
+# serving stale state. It is a local build artifact and is trusted like the
+# code next to it.
+SNAPSHOT_PATH = os.environ.get('STARTUP_SNAPSHOT', 'startup_snapshot.pkl')
+FAST_START = os.environ.get('FAST_START') == '1'
+
+
+def source_digest(extra_paths=()):
+    # Hash of every module next to this file plus extra_paths (e.g. the model)
+    root = os.path.dirname(os.path.abspath(__file__))
+    sha = hashlib.sha1()
+    for path in sorted(glob.glob(os.path.join(root, '*.py'))) + list(extra_paths):
+        sha.update(os.path.basename(path).encode())
+        try:
+            with open(path, 'rb') as f:
+                sha.update(f.read())
+        except IOError:
+            sha.update(b'missing')
+    return sha.hexdigest()[:16]
+
+
+def save_snapshot(key, state, path=SNAPSHOT_PATH):
+    with atomic_write(path, 'wb') as f:
+        pickle.dump(key, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_snapshot(key, path=SNAPSHOT_PATH):
+    # The saved state, or None when there is no snapshot for this key
+    try:
+        with open(path, 'rb') as f:
+            if pickle.load(f) != key:
+                return None
+            return pickle.load(f)
+    except (IOError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
@@ -0,0 +1,49 @@
+import re
+import sys
+import time
+from contextlib import contextmanager
+
+# Worker boot profile. app.py marks the end of each startup phase (imports,
+# dataset, layout, callbacks, ...); every phase records its wall time and how
+# many modules it imported. The profile is logged by gunicorn when a worker
+# is ready and exported on /metrics, so boot time can be tracked per deploy.
+#   python app.py profile
+# prints it for a local import.
+
+
+class StartupProfile(object):
+    def __init__(self):
+        self.phases = []
+        self._last = time.perf_counter()
+        self._modules = len(sys.modules)
+
+    def mark(self, name):
+        # Closes the phase that started at the previous mark
+        now = time.perf_counter()
+        modules = len(sys.modules)
+        self.phases.append((name, now - self._last, modules - self._modules))
+        self._last = now
+        self._modules = modules
+
+    @contextmanager
+    def phase(self, name):
+        # A phase that runs later, e.g. warming the cache from gunicorn
+        start = time.perf_counter()
+        modules = len(sys.modules)
+        yield
+        self.phases.append((name, time.perf_counter() - start, len(sys.modules) - modules))
+
+    def total(self):
+        return sum(seconds for _, seconds, _ in self.phases)
+
+    def report(self):
+        lines = ['%-20s %8.1f ms %6d modules' % (name, seconds * 1000, modules)
+                 for name, seconds, modules in self.phases]
+        lines.append('%-20s %8.1f ms %6d modules' % ('total', self.total() * 1000, len(sys.modules)))
+        return '\n'.join(lines)
+
+    def metrics(self):
+        values = {'startup_%s_seconds' % re.sub(r'\W+', '_', name): round(seconds, 6)
+                  for name, seconds, _ in self.phases}
+        values['startup_total_seconds'] = round(self.total(), 6)
+        return values
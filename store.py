@@ -0,0 +1,244 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from aggregates import SeasonCube
+from dataset import CLUB_FEATURES, COLUMNS, FEATURES, Dataset, atomic_write, column_dtype, season_key
+
+# Partitioned dataset store written by data_preprocssing.py:
+#   store/catalog.json            leagues, their seasons and partition versions
+#   store/<league>/<season>.npz   one uncompressed columnar file per season
+# Workers read the catalog at startup and load a league's partitions only
+# when a session first asks for that league. Loaded partitions and assembled
+# leagues are kept in bounded LRU caches, so memory does not grow with the
+# number of leagues in the store.
+STORE_PATH = 'store'
+CATALOG = 'catalog.json'
+DEFAULT_LEAGUE = os.environ.get('DEFAULT_LEAGUE', 'epl')
+
+PARTITION_CACHE_SIZE = int(os.environ.get('PARTITION_CACHE_SIZE', 128))
+LEAGUE_CACHE_SIZE = int(os.environ.get('LEAGUE_CACHE_SIZE', 4))
+
+
+def partition_path(root, league, season):
+    return os.path.join(root, league, '%d.npz' % season)
+
+
+def read_catalog(root=STORE_PATH):
+    try:
+        with open(os.path.join(root, CATALOG)) as f:
+            return json.load(f)
+    except IOError:
+        return {'version': None, 'leagues': {}}
+
+
+def digest(*parts):
+    sha = hashlib.sha1()
+    for part in parts:
+        sha.update(part if isinstance(part, bytes) else json.dumps(part, sort_keys=True).encode())
+    return sha.hexdigest()[:16]
+
+
+def partition_columns(data):
+    # Columns of one season in the table order: by position
+    data = data.sort_values('position', kind='mergesort')
+    columns = OrderedDict()
+    for name in COLUMNS:
+        if name == 'club_name':
+            columns[name] = np.array(data[name].tolist(), dtype=str)
+        else:
+            columns[name] = np.ascontiguousarray(data[name].values, dtype=column_dtype(name))
+    return columns
+
+
+def write_league(data, league, root=STORE_PATH, name=None):
+    # Replace the league's partitions with the season rows in data. Only
+    # seasons whose content changed are rewritten; the catalog is replaced
+    # last, which is what running workers watch for.
+    data = data.assign(season=season_key(data['season']))
+    catalog = read_catalog(root)
+    previous = catalog['leagues'].get(league, {})
+    old_partitions = previous.get('partitions', {})
+    partitions = {}
+    written = 0
+    if not os.path.isdir(os.path.join(root, league)):
+        os.makedirs(os.path.join(root, league))
+    for season, rows in data.groupby('season'):
+        season = int(season)
+        columns = partition_columns(rows)
+        version = digest(*[column.encode() + values.tobytes() for column, values in columns.items()])
+        path = partition_path(root, league, season)
+        if old_partitions.get(str(season), {}).get('version') != version or not os.path.exists(path):
+            buffer = io.BytesIO()
+            np.savez(buffer, **columns)
+            with atomic_write(path, 'wb') as f:
+                f.write(buffer.getvalue())
+            written += 1
+        partitions[str(season)] = {
+            'rows': int(len(rows)),
+            'version': version,
+            # Features with any recorded (non-zero) value in this season
+            'features': [feature for feature in FEATURES if np.any(columns[feature] != 0)]
+        }
+    for season in set(old_partitions) - set(partitions):
+        os.remove(partition_path(root, league, int(season)))
+
+    seasons = sorted(int(season) for season in partitions)
+    # Club stats charts start at the first season where every club stat is
+    # recorded; None when the league has none
+    club_seasons = [season for season in seasons
+                    if set(CLUB_FEATURES) <= set(partitions[str(season)]['features'])]
+    catalog['leagues'][league] = {
+        'name': name or previous.get('name') or league.upper(),
+        'seasons': seasons,
+        'club_stats_first_season': club_seasons[0] if club_seasons else None,
+        'partitions': partitions,
+        'version': digest(league, [partitions[str(season)]['version'] for season in seasons])
+    }
+    catalog['version'] = digest(sorted((key, value['version']) for key, value in catalog['leagues'].items()))
+    with atomic_write(os.path.join(root, CATALOG), 'w') as f:
+        json.dump(catalog, f, indent=2, sort_keys=True)
+    return written
+
+
+class LRUCache(object):
+    # Bounded, thread-safe memo of build(key). get() also takes the build
+    # function per call, for values built from more than the key.
+    def __init__(self, build, maxsize):
+        self.build = build
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        value = (build or self.build)(key)
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class PartitionStore(object):
+    def __init__(self, root=STORE_PATH, max_partitions=PARTITION_CACHE_SIZE):
+        self.root = root
+        self.catalog = read_catalog(root)
+        # Keyed on the partition version, so partitions replaced by an
+        # ingest are never served from the cache
+        self.partitions = LRUCache(self._read_partition, max_partitions)
+
+    def reload_catalog(self):
+        self.catalog = read_catalog(self.root)
+
+    @property
+    def version(self):
+        return self.catalog['version']
+
+    def leagues(self):
+        return self.catalog['leagues']
+
+    def league(self, league):
+        # Catalog entry; raises KeyError for an unknown league
+        return self.catalog['leagues'][league]
+
+    def _read_partition(self, key):
+        league, season, _ = key
+        with np.load(partition_path(self.root, league, season)) as f:
+            return {name: f[name] for name in f.files}
+
+    def partition(self, league, season):
+        entry = self.league(league)['partitions'][str(season)]
+        return self.partitions.get((league, season, entry['version']))
+
+    def load(self, league, lo=None, hi=None):
+        # Dataset of the league's seasons in [lo, hi], newest season first
+        entry = self.league(league)
+        seasons = [season for season in reversed(entry['seasons'])
+                   if (lo is None or season >= lo) and (hi is None or season <= hi)]
+        parts = [self.partition(league, season) for season in seasons]
+        clubs = sorted(set(club for part in parts for club in part['club_name'].tolist()))
+        columns = {}
+        for name in COLUMNS:
+            values = np.concatenate([part[name] for part in parts]) if parts else np.array([], dtype=column_dtype(name))
+            if name == 'club_name':
+                values = np.searchsorted(np.array(clubs), values).astype(column_dtype(name))
+            columns[name] = values
+        version = entry['version'] if len(seasons) == len(entry['seasons']) else digest(
+            league, [entry['partitions'][str(season)]['version'] for season in seasons])
+        return Dataset(columns, clubs, version)
+
+
+class League(object):
+    # One loaded league: its rows, per-season aggregates and catalog facts
+    def __init__(self, store, league):
+        entry = store.league(league)
+        self.id = league
+        self.name = entry['name']
+        self.version = entry['version']
+        self.data = store.load(league)
+        first = entry.get('club_stats_first_season')
+        # Leagues without club stats get an empty club stats range
+        self.club_first_season = entry['seasons'][-1] + 1 if first is None else first
+        # Club stats bins are fitted on the seasons the club stats charts
+        # show; earlier seasons hold zero placeholders
+        club_seasons = [season for season in entry['seasons'] if season >= self.club_first_season]
+        self.cube = SeasonCube(self.data, recorded={feature: club_seasons for feature in CLUB_FEATURES})
+
+    def season_range(self):
+        return [int(self.cube.seasons[0]), int(self.cube.seasons[-1])]
+
+
+class CatalogWatcher(object):
+    # Notices when an ingest has replaced the catalog. Checks are throttled to
+    # one stat() of catalog.json per interval, so it is cheap to call per request.
+    def __init__(self, root=STORE_PATH, interval=float(os.environ.get('STORE_RELOAD_INTERVAL', 5))):
+        self.catalog_path = os.path.join(root, CATALOG)
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._checked = time.time()
+        self._mtime = self._stat()
+
+    def _stat(self):
+        try:
+            return os.stat(self.catalog_path).st_mtime
+        except OSError:
+            return None
+
+    def changed(self):
+        if time.time() - self._checked < self.interval:
+            return False
+        with self._lock:
+            now = time.time()
+            if now - self._checked < self.interval:
+                return False
+            self._checked = now
+            mtime = self._stat()
+            if mtime == self._mtime:
+                return False
+            self._mtime = mtime
+            return True
@@ -0,0 +1,99 @@
+import numpy as np
+
+# Columns shown in each table tab, as (column id, header)
+TABLE_COLUMNS = {
+    'tab_1': [
+        ('club_name', 'club_name'), ('won', 'won'), ('drawn', 'drawn'), ('lost', 'lost'),
+        ('goal', 'goal'), ('goal_against', 'goal_against'), ('points', 'points'),
+        ('position', 'position'), ('season', 'season')
+    ],
+    'tab_2': [
+        ('club_name', 'Club Name'), ('aerial_battles', 'Aerial Battle'),
+        ('big_chance_created', 'Big Chance Created'), ('clearance', 'Clearance'),
+        ('cross', 'Cross'), ('cross_accuracy', 'Cross Accuracy'),
+        ('goal_conceded_per_match', 'Goal Conceded/match'), ('goal_per_match', 'Goal/match'),
+        ('interceptions', 'Interceptions'), ('pass_accuracy', 'Pass Accuracy'),
+        ('pass_per_game', 'Pass per game'), ('shooting_accuracy', 'Shooting Accuracy'),
+        ('shot_on_target', 'Shot on Target'), ('tackle_success', 'Tackle success'),
+        ('position', 'Position')
+    ]
+}
+
+PAGE_SIZE = 10
+
+# Operators of the DataTable filter syntax, longest spelling first
+OPERATORS = [
+    ['ge ', '>='], ['le ', '<='], ['lt ', '<'], ['gt ', '>'],
+    ['ne ', '!='], ['eq ', '='], ['contains '], ['datestartswith ']
+]
+
+
+def table_columns(tab):
+    return [{'name': name, 'id': column_id} for column_id, name in TABLE_COLUMNS[tab]]
+
+
+def split_filter_part(filter_part):
+    for operator_type in OPERATORS:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+                value_part = value_part.strip()
+                v0 = value_part[0] if value_part else ''
+                if v0 and v0 == value_part[-1] and v0 in ("'", '"', '`'):
+                    value = value_part[1:-1].replace('\\' + v0, v0)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+                return name, operator_type[0].strip(), value
+    return None, None, None
+
+
+def filter_mask(column, operator, value):
+    if operator == 'contains':
+        return np.char.find(np.char.lower(column.astype(str)), str(value).lower()) >= 0
+    if operator == 'datestartswith':
+        return np.char.startswith(column.astype(str), str(value))
+    if column.dtype.kind in 'if' and not isinstance(value, float):
+        # Non-numeric value against a numeric column matches nothing
+        return np.zeros(len(column), dtype=bool)
+    if column.dtype.kind not in 'if':
+        column = column.astype(str)
+        value = str(value)
+    return {
+        'ge': column >= value, 'le': column <= value, 'lt': column < value,
+        'gt': column > value, 'ne': column != value, 'eq': column == value
+    }[operator]
+
+
+def query_rows(data, rows, filter_query='', sort_by=None):
+    # Apply DataTable filter and sort settings to the given row offsets
+    rows = np.asarray(rows)
+    for filter_part in (filter_query or '').split(' && '):
+        name, operator, value = split_filter_part(filter_part)
+        if name not in data.columns:
+            continue
+        rows = rows[filter_mask(np.asarray(data[name][rows]), operator, value)]
+    if sort_by:
+        # lexsort treats the last key as the primary one
+        keys = []
+        for col in reversed(sort_by):
+            values = np.asarray(data[col['column_id']][rows])
+            if values.dtype.kind not in 'if':
+                values = np.unique(values.astype(str), return_inverse=True)[1]
+            keys.append(-values if col['direction'] == 'desc' else values)
+        rows = rows[np.lexsort(keys)]
+    return rows
+
+
+def page_records(data, rows, tab, page_current, page_size=PAGE_SIZE):
+    # Records of a single page; only these are sent to the browser
+    start = page_current * page_size
+    page_rows = rows[start:start + page_size]
+    # Built from the columns directly; a DataFrame per page would make
+    # pandas a dependency of every worker
+    names = [column_id for column_id, _ in TABLE_COLUMNS[tab]]
+    values = [np.asarray(data[name][page_rows]).tolist() for name in names]
+    return [dict(zip(names, row)) for row in zip(*values)]
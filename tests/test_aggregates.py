@@ -0,0 +1,112 @@
+import json
+import os
+import shutil
+import subprocess
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import SeasonCube, WINDOW_STATS
+
+from conftest import ROOT
+
+SEASONS = list(range(2001, 2013))
+# Rows per season in each group, as in a 20 club league
+GROUP_ROWS = {1: 4, 0: 16}
+# points spans more values than MAX_BINS, so its histogram bins are 2 wide
+FEATURES = ['won', 'points', 'pass_per_game']
+
+
+@pytest.fixture(scope='module')
+def frame():
+    rng = np.random.RandomState(0)
+    rows = []
+    for season in SEASONS:
+        for group, n in GROUP_ROWS.items():
+            for _ in range(n):
+                rows.append({
+                    'season': season,
+                    'is_top4': group,
+                    'won': rng.randint(0, 30),
+                    'points': rng.randint(10, 100),
+                    'pass_per_game': round(rng.uniform(300, 700), 2)
+                })
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture(scope='module')
+def cube(frame):
+    return SeasonCube(frame, FEATURES)
+
+
+def pandas_window(frame, feature, group, lo, hi, stat, window):
+    # The same statistic from pandas rolling windows over the group's rows in
+    # season order; every season has the same number of rows, so a window of
+    # N seasons is a window of N * rows rows ending at the season's last row
+    rows = frame[(frame['is_top4'] == group) & (frame['season'] >= lo) & (frame['season'] <= hi)]
+    values = rows.sort_values('season', kind='mergesort')[feature].reset_index(drop=True)
+    n = GROUP_ROWS[group]
+    if stat == 'mean':
+        result = values.rolling(n).mean()
+    elif stat == 'expanding_mean':
+        result = values.expanding().mean()
+    else:
+        result = getattr(values.rolling(n * window, min_periods=1), stat.split('_')[1])()
+    return result.values[n - 1::n]
+
+
+@pytest.mark.parametrize('stat', WINDOW_STATS)
+@pytest.mark.parametrize('feature', FEATURES)
+@pytest.mark.parametrize('group', [1, 0])
+@pytest.mark.parametrize('lo, hi, window', [(2001, 2012, 3), (2004, 2010, 2), (2003, 2012, 5), (2006, 2006, 3)])
+def test_window_stats_match_pandas(frame, cube, stat, feature, group, lo, hi, window):
+    got = cube.window_stats(feature, group, lo, hi, stat, window)
+    expected = pandas_window(frame, feature, group, lo, hi, stat, window)
+    np.testing.assert_allclose(got, expected, rtol=0, atol=1e-9)
+
+
+def test_rolling_median_is_exact_for_wide_features(frame, cube):
+    # The median does not come from the display bins
+    assert cube.binning['points'].width > 1
+    got = cube.window_stats('points', 0, 2001, 2012, 'rolling_median', 3)
+    np.testing.assert_array_equal(got, pandas_window(frame, 'points', 0, 2001, 2012, 'rolling_median', 3))
+
+
+def test_binning_skips_unrecorded_seasons(frame):
+    # Zero placeholders before a feature is recorded do not stretch its bins
+    frame = frame.assign(pass_per_game=np.where(frame['season'] < 2006, 0, frame['pass_per_game']))
+    recorded = {'pass_per_game': [season for season in SEASONS if season >= 2006]}
+    binning = SeasonCube(frame, FEATURES, recorded=recorded).binning['pass_per_game']
+    assert binning.start > 0
+    assert binning.width == SeasonCube(frame[frame['season'] >= 2006], FEATURES).binning['pass_per_game'].width
+
+
+NODE_SCRIPT = '''
+global.window = {};
+require(process.argv[1]);
+var input = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+var charts = window.dash_clientside.charts;
+process.stdout.write(JSON.stringify(input.calls.map(function(call) {
+    var fig = charts.table_timeseries([1, 0], call.range, call.feature, call.stat, call.size, input.agg);
+    return fig.data.map(function(trace) { return trace.y; });
+})));
+'''
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_clientside_window_stats_match_cube(cube):
+    # assets/charts.js mirrors SeasonCube.window_stats
+    agg = cube.client_payload()
+    agg['layout'] = {'title': {}}
+    calls = [{'range': [lo, hi], 'feature': feature, 'stat': stat, 'size': window}
+             for feature in FEATURES for stat in WINDOW_STATS
+             for lo, hi, window in [(2001, 2012, 3), (2004, 2010, 2), (2006, 2006, 3)]]
+    out = subprocess.run(['node', '-e', NODE_SCRIPT, os.path.join(ROOT, 'assets', 'charts.js')],
+                         input=json.dumps({'agg': agg, 'calls': calls}).encode(), stdout=subprocess.PIPE,
+                         check=True).stdout
+    for call, traces in zip(calls, json.loads(out.decode())):
+        for group, y in zip([1, 0], traces):
+            expected = cube.window_stats(call['feature'], group, call['range'][0], call['range'][1], call['stat'],
+                                         call['size'])
+            np.testing.assert_allclose(np.array(y, dtype=float), expected, rtol=1e-9, atol=1e-9)
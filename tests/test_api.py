@@ -0,0 +1,72 @@
+import os
+
+import flask
+import pytest
+
+import api
+import compress
+from conftest import ROOT
+from store import League, PartitionStore
+
+
+@pytest.fixture(scope='module')
+def client():
+    store = PartitionStore(os.path.join(ROOT, 'store'))
+    league = League(store, 'epl')
+
+    def source(name):
+        if name != 'epl':
+            raise KeyError(name)
+        return league
+    server = flask.Flask(__name__)
+    api.init_app(server, source, 'epl')
+    compress.init_app(server)
+    return server.test_client()
+
+
+@pytest.mark.parametrize('encoding', ['', 'gzip'])
+def test_etags_are_strong_and_encoding_specific(client, encoding):
+    headers = {'Accept-Encoding': encoding}
+    response = client.get('/api/v1/meta', headers=headers)
+    etag = response.headers['ETag']
+    assert not etag.startswith('W/')
+    assert etag.endswith('-gzip"') == (encoding == 'gzip')
+    assert response.headers.get('Content-Encoding') == (encoding or None)
+
+    headers['If-None-Match'] = etag
+    response = client.get('/api/v1/meta', headers=headers)
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+
+
+def test_etag_of_another_encoding_still_validates(client):
+    etag = client.get('/api/v1/meta', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+    response = client.get('/api/v1/meta', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+
+@pytest.mark.parametrize('query', [
+    {'kind': 'rows', 'filter': 5},
+    {'kind': 'rows', 'sort': [{'column_id': 'points'}]},
+    {'kind': 'rows', 'sort': 5},
+    {'kind': 'rows', 'column': [['points']]},
+    {'kind': 'clubs', 'club': [['x']], 'feature': 'points'},
+    {'kind': 'clubs', 'club': 'Arsenal', 'feature': {'name': 'points'}},
+    {'kind': 'aggregates', 'feature': [None]}
+])
+def test_malformed_batch_queries_are_rejected(client, query):
+    response = client.post('/api/v1/batch', json={'queries': [query]})
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('query 0: ')
+
+
+def test_batch(client):
+    response = client.post('/api/v1/batch', json={'queries': [
+        {'kind': 'rows', 'filter': '{points} > 80', 'sort': ['points:desc'], 'column': ['club_name', 'points']},
+        {'kind': 'clubs', 'club': ['Arsenal'], 'feature': 'points', 'lo': 2019, 'hi': 2020}
+    ]})
+    assert response.status_code == 200
+    rows, clubs = response.get_json()['results']
+    assert rows['rows'] > 0 and min(rows['columns']['points']) > 80
+    assert rows['columns']['points'] == sorted(rows['columns']['points'], reverse=True)
+    assert clubs['columns']['season'] == [2019, 2020]
@@ -0,0 +1,48 @@
+import os
+import threading
+
+import cache
+from cache import FigureCache
+
+
+def shared_files(figures):
+    return [name for name in os.listdir(figures._namespace_dir()) if name.endswith('.json')]
+
+
+def test_shared_tier_is_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, 'SHARED_PRUNE_INTERVAL', 1)
+    figures = FigureCache(shared_dir=str(tmp_path), namespace='v1', shared_max_files=10)
+    for i in range(50):
+        figures.set(figures.make_key('show_table', ['epl', i]), {'page': i})
+    assert len(shared_files(figures)) == 10
+    # The newest files are kept
+    reader = FigureCache(shared_dir=str(tmp_path), namespace='v1')
+    assert reader.get(reader.make_key('show_table', ['epl', 49])) == {'page': 49}
+
+
+def test_namespace_change_removes_old_files(tmp_path):
+    figures = FigureCache(shared_dir=str(tmp_path), namespace='v1')
+    figures.set(figures.make_key('table_barplot', ['epl']), {'data': []})
+    figures.set_namespace('v2')
+    assert os.listdir(str(tmp_path)) == [os.path.basename(figures._namespace_dir())]
+    assert figures.get(figures.make_key('table_barplot', ['epl'])) is None
+
+
+def test_concurrent_writes_of_one_key(tmp_path):
+    figures = FigureCache(shared_dir=str(tmp_path), namespace='v1')
+    key = figures.make_key('table_barplot', ['epl'])
+    errors = []
+
+    def write(i):
+        try:
+            for _ in range(50):
+                figures.set(key, {'data': [i] * 100})
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=write, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert shared_files(figures) == [os.path.basename(figures._shared_path(key))]
@@ -0,0 +1,60 @@
+import os
+
+import pandas as pd
+import pytest
+
+from conftest import ROOT
+from data_preprocssing import assign_table_seasons, clean_clubstats, ingest
+from store import CATALOG, PartitionStore, partition_path, read_catalog
+
+
+@pytest.fixture
+def season_files(tmp_path):
+    # The repository's CSVs split into per-season files with a season column
+    clubstats = pd.read_csv(os.path.join(ROOT, 'clubstats.csv'))
+    tables = assign_table_seasons(pd.read_csv(os.path.join(ROOT, 'tables.csv')), clean_clubstats(clubstats))
+
+    def write(seasons):
+        name = '_'.join(season.replace('/', '') for season in seasons)
+        tables_path = str(tmp_path / ('tables_%s.csv' % name))
+        clubstats_path = str(tmp_path / ('clubstats_%s.csv' % name))
+        tables[tables['season'].isin(seasons)].to_csv(tables_path, index=False)
+        clubstats[clubstats['season'].isin(seasons)].to_csv(clubstats_path, index=False)
+        return tables_path, clubstats_path, int((clubstats['season'].isin(seasons)).sum())
+    return write
+
+
+def test_ingest_twice_is_a_no_op(tmp_path, season_files):
+    root = str(tmp_path / 'store')
+    tables_path, clubstats_path, rows = season_files(['2019/20'])
+
+    assert ingest(tables_path, clubstats_path, 'epl', root) == rows
+    catalog = read_catalog(root)
+    partition = partition_path(root, 'epl', 2020)
+    mtime = os.stat(partition).st_mtime_ns
+    with open(os.path.join(root, CATALOG)) as f:
+        catalog_text = f.read()
+
+    assert ingest(tables_path, clubstats_path, 'epl', root) == 0
+    assert read_catalog(root) == catalog
+    with open(os.path.join(root, CATALOG)) as f:
+        assert f.read() == catalog_text
+    assert os.stat(partition).st_mtime_ns == mtime
+    assert len(PartitionStore(root).load('epl')) == rows
+
+
+def test_ingest_appends_new_seasons_only(tmp_path, season_files):
+    root = str(tmp_path / 'store')
+    first = season_files(['2019/20'])
+    both = season_files(['2018/19', '2019/20'])
+    ingest(first[0], first[1], 'epl', root)
+    version = read_catalog(root)['leagues']['epl']['partitions']['2020']['version']
+    mtime = os.stat(partition_path(root, 'epl', 2020)).st_mtime_ns
+
+    assert ingest(both[0], both[1], 'epl', root) == both[2] - first[2]
+    entry = read_catalog(root)['leagues']['epl']
+    assert entry['seasons'] == [2019, 2020]
+    # The partition of the season that gained no rows is not rewritten
+    assert entry['partitions']['2020']['version'] == version
+    assert os.stat(partition_path(root, 'epl', 2020)).st_mtime_ns == mtime
+    assert len(PartitionStore(root).load('epl')) == both[2]
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset import COLUMNS
+from matches import load_matches
+
+CLUBS = ['Arsenal', 'Chelsea', 'Everton', 'Fulham', 'Leeds', 'Wolves']
+
+
+@pytest.fixture(scope='module')
+def matches():
+    # Double round robin over three seasons with a few unrecorded stats
+    rng = np.random.RandomState(1)
+    rows = []
+    for season in ['2017/18', '2018/19', '2019/20']:
+        for home in CLUBS:
+            for away in CLUBS:
+                if home != away:
+                    rows.append({
+                        'season': season,
+                        'home_team': home,
+                        'away_team': away,
+                        'home_goals': rng.randint(0, 5),
+                        'away_goals': rng.randint(0, 4),
+                        'home_clearance': rng.randint(5, 40),
+                        'away_clearance': rng.randint(5, 40),
+                        'home_pass_per_game': rng.uniform(300, 700) if rng.rand() > 0.1 else np.nan,
+                        'away_pass_per_game': rng.uniform(300, 700) if rng.rand() > 0.1 else np.nan
+                    })
+    return pd.DataFrame(rows)
+
+
+def pandas_totals(matches):
+    # Club/season totals from one groupby over both sides of every match
+    sides = []
+    for side, other in [('home', 'away'), ('away', 'home')]:
+        sides.append(pd.DataFrame({
+            'club_name': matches[side + '_team'],
+            'season': matches['season'].str[:4].astype(int) + 1,
+            'goal': matches[side + '_goals'],
+            'goal_against': matches[other + '_goals'],
+            'clearance': matches[side + '_clearance'],
+            'pass_per_game': matches[side + '_pass_per_game']
+        }))
+    sides = pd.concat(sides, ignore_index=True)
+    sides['won'] = (sides['goal'] > sides['goal_against']).astype(int)
+    sides['drawn'] = (sides['goal'] == sides['goal_against']).astype(int)
+    sides['lost'] = (sides['goal'] < sides['goal_against']).astype(int)
+    grouped = sides.groupby(['club_name', 'season'])
+    totals = grouped[['won', 'drawn', 'lost', 'goal', 'goal_against', 'clearance']].sum()
+    totals['pass_per_game'] = grouped['pass_per_game'].mean()
+    return totals
+
+
+@pytest.mark.parametrize('chunksize', [7, 1000])
+def test_load_matches_matches_groupby(tmp_path, matches, chunksize):
+    path = str(tmp_path / 'matches.csv')
+    matches.to_csv(path, index=False)
+    data = load_matches(path, chunksize).set_index(['club_name', 'season'])
+    expected = pandas_totals(matches)
+
+    assert list(data.reset_index().columns) == COLUMNS
+    assert sorted(data.index) == sorted(expected.index)
+    data = data.loc[expected.index]
+    for column in ['won', 'drawn', 'lost', 'goal', 'goal_against', 'clearance']:
+        np.testing.assert_array_equal(data[column].values, expected[column].values)
+    np.testing.assert_allclose(data['pass_per_game'].values, expected['pass_per_game'].round(2).values, atol=1e-9)
+    np.testing.assert_array_equal(data['points'].values, 3 * expected['won'].values + expected['drawn'].values)
+    np.testing.assert_array_equal(data['total_games'].values, 2 * (len(CLUBS) - 1))
+    # Unrecorded club stats are left at zero
+    assert (data['aerial_battles'] == 0).all()
+
+
+def test_load_matches_positions(tmp_path, matches):
+    path = str(tmp_path / 'matches.csv')
+    matches.to_csv(path, index=False)
+    data = load_matches(path, 7)
+    for _, season in data.groupby('season'):
+        season = season.sort_values('position')
+        assert season['position'].tolist() == list(range(1, len(CLUBS) + 1))
+        assert (np.diff(season['points'].values) <= 0).all()
+        assert season['is_top4'].tolist() == [1] * 4 + [0] * (len(CLUBS) - 4)
@@ -0,0 +1,23 @@
+from metrics import CallbackMetrics
+
+
+def test_panels_are_timed_inside_a_fused_callback():
+    metrics = CallbackMetrics()
+
+    @metrics.panel
+    def table_barplot(league):
+        return {'data': []}
+
+    @metrics.panel
+    def show_table(league):
+        return [], []
+
+    @metrics.instrument
+    def update_dashboard(league):
+        return [table_barplot(league), show_table(league), show_table(league)]
+
+    update_dashboard('epl')
+    text = metrics.render()
+    assert 'dash_callback_compute_seconds_count{callback="update_dashboard"} 1' in text
+    assert 'dash_panel_compute_seconds_count{panel="table_barplot"} 1' in text
+    assert 'dash_panel_compute_seconds_count{panel="show_table"} 2' in text